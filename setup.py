@@ -7,4 +7,5 @@ setup(name='sqlalchemy-extensions',
     author='Parnell',
     author_email='',
     license='Apache License 2',
-    packages=find_packages())
\ No newline at end of file
+    packages=find_packages(),
+    extras_require={'orjson': ['orjson'], 'asyncio': ['sqlalchemy[asyncio]']})
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""asyncio versions of the SQLAlchemy session extensions.
+
+Each method runs the SessionExtensions method on the wrapped sync session
+with AsyncSession.run_sync. The statements of one call, including the ones
+for relationships, share the session's single connection and transaction,
+so they are sent one after another. Concurrency comes from running separate
+AsyncSessions in separate tasks, an AsyncSession can't be shared between tasks.
+"""
+from typing import Any, Iterable, List, Optional, Sequence, Set, Tuple, Type, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm.interfaces import ORMOption
+
+from sqlalchemy_extensions.orm.decl_base import DeclarativeBase
+from sqlalchemy_extensions.orm.session_extension import SessionExtensions
+
+
+class AsyncSessionExtensions(AsyncSession):
+    """AsyncSession whose sync session is a SessionExtensions"""
+
+    sync_session_class = SessionExtensions
+
+    async def attach_keys(
+        self, obj: DeclarativeBase, allow_id_overwrite: bool = False
+    ) -> Tuple[DeclarativeBase, bool]:
+        """Async SessionExtensions.attach_keys"""
+        return await self.run_sync(
+            SessionExtensions.attach_keys, obj, allow_id_overwrite
+        )
+
+    async def attach_keys_all(
+        self, objects: Iterable[DeclarativeBase], allow_id_overwrite: bool = False
+    ) -> List[bool]:
+        """Async SessionExtensions.attach_keys_all"""
+        return await self.run_sync(
+            SessionExtensions.attach_keys_all, objects, allow_id_overwrite
+        )
+
+    async def count(self, cls: Type[DeclarativeBase]) -> int:
+        """Async SessionExtensions.count"""
+        return await self.run_sync(SessionExtensions.count, cls)
+
+    async def find_keys(
+        self,
+        obj_class: Type[DeclarativeBase],
+        logical_values: Union[Any, Iterable[Any]],
+    ) -> Union[Any, Tuple[Any]]:
+        """Async SessionExtensions.find_keys"""
+        return await self.run_sync(
+            SessionExtensions.find_keys, obj_class, logical_values
+        )
+
+    async def find_keys_all(
+        self,
+        obj_class: Type[DeclarativeBase],
+        logical_values: Iterable[Union[Any, Iterable[Any]]],
+    ) -> List[Tuple[Any]]:
+        """Async SessionExtensions.find_keys_all"""
+        return await self.run_sync(
+            SessionExtensions.find_keys_all, obj_class, logical_values
+        )
+
+    async def insert_ignore_all(
+        self,
+        objects: Iterable[DeclarativeBase],
+        commit: bool = False,
+        flush: bool = False,
+        refresh: bool = False,
+        classes_seen: Set[Type[DeclarativeBase]] = None,
+    ) -> List[DeclarativeBase]:
+        """Async SessionExtensions.insert_ignore_all"""
+        return await self.run_sync(
+            SessionExtensions.insert_ignore_all,
+            objects,
+            commit=commit,
+            flush=flush,
+            refresh=refresh,
+            classes_seen=classes_seen,
+        )
+
+    async def insert_ignore(
+        self,
+        obj: Union[DeclarativeBase, Iterable[DeclarativeBase]],
+        _warn: bool = True,
+        commit: bool = False,
+        flush: bool = False,
+        refresh: bool = False,
+        classes_seen: Set[Type[DeclarativeBase]] = None,
+        optimistic: bool = False,
+    ) -> DeclarativeBase:
+        """Async SessionExtensions.insert_ignore"""
+        return await self.run_sync(
+            SessionExtensions.insert_ignore,
+            obj,
+            _warn=_warn,
+            commit=commit,
+            flush=flush,
+            refresh=refresh,
+            classes_seen=classes_seen,
+            optimistic=optimistic,
+        )
+
+    async def lexists(self, obj: DeclarativeBase) -> Any:
+        """Async SessionExtensions.lexists"""
+        return await self.run_sync(SessionExtensions.lexists, obj)
+
+    async def lexists_all(self, objects: Iterable[DeclarativeBase]) -> List[Tuple[Any]]:
+        """Async SessionExtensions.lexists_all"""
+        return await self.run_sync(SessionExtensions.lexists_all, objects)
+
+    async def lget(
+        self,
+        obj_class: Type[DeclarativeBase],
+        values: Union[Any, Iterable[Any]],
+        options: Optional[Sequence[ORMOption]] = None,
+    ) -> DeclarativeBase:
+        """Async SessionExtensions.lget"""
+        return await self.run_sync(
+            SessionExtensions.lget, obj_class, values, options=options
+        )
+
+    async def linsert_ignore_all(
+        self,
+        objects: Iterable[DeclarativeBase],
+        commit: bool = False,
+        flush: bool = False,
+        refresh: bool = False,
+        classes_seen: Set[Type[DeclarativeBase]] = None,
+    ) -> List[DeclarativeBase]:
+        """Async SessionExtensions.linsert_ignore_all"""
+        return await self.run_sync(
+            SessionExtensions.linsert_ignore_all,
+            objects,
+            commit=commit,
+            flush=flush,
+            refresh=refresh,
+            classes_seen=classes_seen,
+        )
+
+    async def linsert_ignore(
+        self,
+        obj: Union[DeclarativeBase, Iterable[DeclarativeBase]],
+        _warn: bool = False,
+        commit: bool = False,
+        flush: bool = False,
+        refresh: bool = False,
+        classes_seen: Set[Type[DeclarativeBase]] = None,
+        options: Optional[Sequence[ORMOption]] = None,
+    ) -> DeclarativeBase:
+        """Async SessionExtensions.linsert_ignore"""
+        return await self.run_sync(
+            SessionExtensions.linsert_ignore,
+            obj,
+            _warn=_warn,
+            commit=commit,
+            flush=flush,
+            refresh=refresh,
+            classes_seen=classes_seen,
+            options=options,
+        )
+
+    async def linsert_update(
+        self,
+        obj: Union[DeclarativeBase, Iterable[DeclarativeBase]],
+        load: bool = True,
+        options: Optional[Sequence[ORMOption]] = None,
+        _warn: bool = False,
+        commit: bool = False,
+        flush: bool = False,
+        refresh: bool = False,
+    ) -> DeclarativeBase:
+        """Async SessionExtensions.linsert_update"""
+        return await self.run_sync(
+            SessionExtensions.linsert_update,
+            obj,
+            load=load,
+            options=options,
+            _warn=_warn,
+            commit=commit,
+            flush=flush,
+            refresh=refresh,
+        )
+
+    async def linsert_update_all(
+        self,
+        objs: Iterable[DeclarativeBase],
+        load: bool = True,
+        options: Optional[Sequence[ORMOption]] = None,
+        commit: bool = False,
+        flush: bool = False,
+        refresh: bool = False,
+    ) -> DeclarativeBase:
+        """Async SessionExtensions.linsert_update_all"""
+        return await self.run_sync(
+            SessionExtensions.linsert_update_all,
+            objs,
+            load=load,
+            options=options,
+            commit=commit,
+            flush=flush,
+            refresh=refresh,
+        )
+
+
+class extended_async_sessionmaker(async_sessionmaker):
+    """Class to create an extended AsyncSession"""
+
+    def __init__(
+        self,
+        bind: Any = None,
+        *,
+        class_: Type[AsyncSession] = AsyncSessionExtensions,
+        **kw: Any,
+    ):
+        """Init for extended_async_sessionmaker. Like extended_sessionmaker,
+        class_ is combined with AsyncSessionExtensions and a sync_session_class
+        with SessionExtensions if they aren't already subclasses
+
+        Args:
+            bind (Any, optional): async engine or connection for the sessions.
+                Defaults to None.
+            class_ (Type[AsyncSession], optional): async session class.
+                Defaults to AsyncSessionExtensions.
+        """
+        if not issubclass(class_, AsyncSessionExtensions):
+            class_ = type(class_.__name__, (AsyncSessionExtensions, class_), {})
+        sync_session_class = kw.get("sync_session_class")
+        if sync_session_class is not None and not issubclass(
+            sync_session_class, SessionExtensions
+        ):
+            kw["sync_session_class"] = type(
+                sync_session_class.__name__,
+                (SessionExtensions, sync_session_class),
+                {},
+            )
+        super().__init__(bind, class_=class_, **kw)
+
@@ -1,37 +1,107 @@
-from collections import defaultdict
+import json
+import sys
+import weakref
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Self, Tuple, Type
+from datetime import date, datetime, time
+from enum import Enum
+from itertools import chain
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, Self, Tuple, Type
 
-from sqlalchemy import orm
+from sqlalchemy import event, orm
 from sqlalchemy.dialects import registry
-from sqlalchemy.engine.default import DefaultDialect
 from sqlalchemy.orm import declarative_base as sa_declarative_base
+from sqlalchemy.orm.properties import MappedColumn as _MappedColumn
+from sqlalchemy.orm.relationships import Relationship as _SARelationship
 from sqlalchemy.schema import Column
+from sqlalchemy.sql import tuple_
+from sqlalchemy.sql.elements import Tuple as SQLTuple
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-class LogicalKey(DefaultDialect):
+
+class LogicalKey:
     """Class to allow logical_key to be passed inside of Columns
     and mapped_column without warnings.
     Specifically registers "logical" and the Dialect arguments is "key"
     or any other _prefix.
     Example: logical_foo=True would be "logical" : {"foo":True}
+    Only construct_arguments is read when validating dialect kwargs,
+    None allows any argument
     """
 
+    __slots__ = ()
+    name = "logical"
+    construct_arguments = None
+
 
 registry.register("logical", "sqlalchemy_extensions.orm.decl_base", "LogicalKey")
 
 
-@dataclass
+def _tuple_getter(names: Tuple[str, ...]) -> Callable[[Any], Tuple[Any, ...]]:
+    """Make an attrgetter that always returns a tuple, even for 0 or 1 names
+
+    Args:
+        names (Tuple[str, ...]): attribute names to get
+
+    Returns:
+        Callable[[Any], Tuple[Any, ...]]: function returning a tuple of values
+    """
+    if len(names) > 1:
+        return attrgetter(*names)
+    if names:
+        getter = attrgetter(names[0])
+        return lambda obj: (getter(obj),)
+    return lambda obj: ()
+
+
+## attribute types that _make_columns handles, anything else is skipped
+_COLUMN_ATTR_TYPES = (_SARelationship, _MappedColumn, Column)
+
+
+def _json_default(value: Any) -> Any:
+    """json default that serializes the values orjson handles natively the
+    way orjson does, dates and times as ISO 8601 and enums as their value.
+    Anything else is converted with str
+
+    Args:
+        value (Any): value the json module can't serialize
+
+    Returns:
+        Any: serializable value
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+@dataclass(slots=True)
 class Relationship:
     start_col: str = None
     end_col: str = None
 
 
 class DeclarativeBase:
-    _key_columns: List[Column] = None
-    _log_columns: List[Column] = None
-    _all_columns: List[Column] = None
+    _key_columns: Tuple[Column, ...] = None
+    _log_columns: Tuple[Column, ...] = None
+    _all_columns: Tuple[Column, ...] = None
+    _key_names: Tuple[str, ...] = None
+    _log_names: Tuple[str, ...] = None
+    _all_column_names: Tuple[str, ...] = None
+    _public_column_names: Tuple[str, ...] = None
+    _public_column_getter: Callable[[Any], Tuple[Any, ...]] = None
+    _key_getter: Callable[[Any], Tuple[Any, ...]] = None
+    _log_getter: Callable[[Any], Tuple[Any, ...]] = None
+    _key_tuple: SQLTuple = None
+    _log_tuple: SQLTuple = None
     _rel_columns: Dict = None
+    _repr_fields: Tuple[str, ...] = None
+    _repr_prefix: str = None
 
     def __init_subclass__(cls, *args, **kwargs) -> None:
         cls._make_columns()
@@ -48,34 +118,32 @@ class DeclarativeBase:
         cls._log_columns = []
         all_cols = []
         cls._rel_columns = {}
+        columns2name = Registry._columns2name
+        fk_referred_from = Registry._fk_referred_from
 
         for k, v in vars(cls).items():
+            ## dunders (__table__, __module__, ...) are never columns, but
+            ## _private attributes can be, e.g. _name = mapped_column("name")
+            if k.startswith("__") or not isinstance(v, _COLUMN_ATTR_TYPES):
+                continue
             col = None
-            if isinstance(v, orm.relationships.Relationship):
+            if isinstance(v, _SARelationship):
                 cls._rel_columns[k] = v  # back populates is important
-            elif isinstance(v, orm.properties.MappedColumn):
+            elif isinstance(v, _MappedColumn):
                 col = v.column
-            elif isinstance(v, Column):
+            else:
                 col = v
             if col is not None:
-                found = Registry._columns2name.get(col)
-                Registry._columns2name[col] = (cls, k)
+                columns2name[col] = (weakref.ref(cls), k)
                 ## Add in Foreign Keys
+                ## The class isn't mapped yet so fk.column can't be resolved,
+                ## target_fullname is "[schema.]table.column" for every colspec
                 for fk in col.foreign_keys:
-                    try:
-                        fkcol = fk.column
-                        if not fkcol.table:
-                            fktable = cls  ## self reference
-                        else:
-                            fktable = fkcol.table.name
-                        Registry._fk_referred_from[fktable][cls][k] = Relationship(
-                            fkcol.name, k
-                        )
-                    except:
-                        fktable, fkcol = fk.target_fullname.split(".")
-                        Registry._fk_referred_from[fktable][cls][k] = Relationship(
-                            fkcol, k
-                        )
+                    fktable, fkcol = fk.target_fullname.split(".")[-2:]
+                    rels = fk_referred_from.setdefault(
+                        fktable, weakref.WeakKeyDictionary()
+                    ).setdefault(cls, {})
+                    rels[k] = Relationship(fkcol, k)
                 found = False
                 if col.primary_key:
                     cls._key_columns.append(col)
@@ -87,50 +155,133 @@ class DeclarativeBase:
                 if not found:
                     all_cols.append(col)
 
-        _all_columns = [*cls._key_columns, *cls._log_columns, *all_cols]
-        cls._all_columns = list(set(_all_columns))
+        ## order preserving dedup, a column can be both a key and logical key
+        cls._all_columns = list(
+            dict.fromkeys(chain(cls._key_columns, cls._log_columns, all_cols))
+        )
+
+    @classmethod
+    def _freeze_columns(cls) -> None:
+        """Store the key, log, and all columns as tuples and cache their names.
+        Run once the class is mapped, as column names are not assigned until then
+        and SQLAlchemy warns about tuples of columns during the declarative scan.
+        """
+        cls._key_columns = tuple(cls._key_columns)
+        cls._log_columns = tuple(cls._log_columns)
+        cls._all_columns = tuple(cls._all_columns)
+        ## interned so getattr and dict lookups can compare names by identity
+        cls._key_names = tuple(sys.intern(str(c.name)) for c in cls._key_columns)
+        cls._log_names = tuple(sys.intern(str(c.name)) for c in cls._log_columns)
+        cls._all_column_names = tuple(
+            sys.intern(str(c.name)) for c in cls._all_columns
+        )
+        cls._key_getter = staticmethod(_tuple_getter(cls._key_names))
+        cls._log_getter = staticmethod(_tuple_getter(cls._log_names))
+        cls._public_column_names = tuple(
+            n for n in cls._all_column_names if not n.startswith("_")
+        )
+        cls._public_column_getter = staticmethod(
+            _tuple_getter(cls._public_column_names)
+        )
+        ## tuple_(...) expressions for the IN lookups, reused for every statement
+        cls._key_tuple = tuple_(*cls._key_columns)
+        cls._log_tuple = tuple_(*cls._log_columns)
+
+    @classmethod
+    def _class_cache(cls) -> Dict[Any, Any]:
+        """Get the dict for values cached per class, e.g. prepared statements.
+        It is kept in the class's own __dict__, so subclasses get their own and
+        the cached values are collected with the class
 
-    def to_json(
-        self, include_all_columns=False, include_private=False
-    ) -> Dict[str, Any]:
-        """Return a json that has the variables and values from this object
+        Returns:
+            Dict[Any, Any]: the class's cache
+        """
+        cache = cls.__dict__.get("_cache")
+        if cache is None:
+            cache = {}
+            type.__setattr__(cls, "_cache", cache)
+        return cache
+
+    @classmethod
+    def _make_repr_fields(cls) -> None:
+        """Make the field names and prefix used by __repr__.
+        Keys and logical keys come first then the remaining public attributes
+        """
+        fields = dict.fromkeys(chain(cls._key_names, cls._log_names))
+        remove = {"metadata", "registry", *fields}
+        extra = [
+            var
+            for var in dir(cls)
+            if var not in remove
+            and not var.startswith("_")
+            and not callable(getattr(cls, var))
+        ]
+        cls._repr_fields = (*fields, *sorted(extra))
+        cls._repr_prefix = cls.__name__
+
+    def to_dict(self, include_all_columns=False, include_private=False) -> Dict:
+        """Return a dict that has the variables and values from this object
 
         Args:
+            include_all_columns (bool, optional):
+                include columns that haven't been loaded or set. Defaults to False.
             include_private (bool, optional):
                 include '_' prefixed variables. Defaults to False.
 
         Returns:
             Dict: dict of variables and values
         """
-        if include_all_columns:
-            d = {c.name: getattr(self, c.name) for c in self._all_columns}
-            d.update(vars(self))
+        if include_all_columns and not include_private:
+            ## common case, get every public column with one attrgetter call
+            d = dict(zip(self._public_column_names, self._public_column_getter(self)))
+            for k, v in vars(self).items():
+                if not k.startswith("_"):
+                    d[k] = v
+            return d
+        if include_private:
+            d = dict(vars(self))
         else:
-            d = vars(self)
+            d = {k: v for k, v in vars(self).items() if not k.startswith("_")}
+        if include_all_columns:
+            for name in self._all_column_names:
+                if name not in d and (include_private or not name.startswith("_")):
+                    d[name] = getattr(self, name)
+        return d
 
-        if include_private:
-            return d
-        return {k: v for k, v in d.items() if not k.startswith("_")}
+    ## to_json returns a dict, kept for backwards compatibility
+    to_json = to_dict
 
-    def to_dict(self, include_all_columns=False, include_private=False) -> Dict:
-        """Return a dict that has the variables and values from this object
+    def to_json_bytes(self, include_all_columns=False, include_private=False) -> bytes:
+        """Return the object serialized as json bytes.
+        Uses orjson when it is installed, otherwise the standard json module
+        with the same compact output. Dates and times are ISO 8601, other
+        values that aren't json serializable are converted with str
 
         Args:
+            include_all_columns (bool, optional):
+                include columns that haven't been loaded or set. Defaults to False.
             include_private (bool, optional):
                 include '_' prefixed variables. Defaults to False.
 
         Returns:
-            Dict: dict of variables and values
+            bytes: json encoded variables and values
         """
-        return self.to_json(include_private=include_private)
+        d = self.to_dict(
+            include_all_columns=include_all_columns, include_private=include_private
+        )
+        if orjson is not None:
+            return orjson.dumps(d, default=str)
+        return json.dumps(
+            d, default=_json_default, separators=(",", ":"), ensure_ascii=False
+        ).encode()
 
     @property
     def _log_vals(self) -> Tuple[Any]:
-        return tuple([getattr(self, k.name) for k in self._log_columns])
+        return self._log_getter(self)
 
     @property
     def _key_vals(self) -> Tuple[Any]:
-        return tuple([getattr(self, k.name) for k in self._key_columns])
+        return self._key_getter(self)
 
     @classmethod
     def from_dict(cls, values_dict: Dict[str, Any]) -> Self:
@@ -147,21 +298,51 @@ class DeclarativeBase:
             setattr(instance, k, v)
         return instance
 
+    @classmethod
+    def from_dicts(cls, values_dicts: Iterable[Dict[str, Any]]) -> List[Self]:
+        """Create objects from dicts of variables and values.
+        Values of columns without set listeners, e.g. @validates, are written to
+        the new instance's __dict__, skipping the attribute events fired by
+        setattr. Other values (relationships, validated columns etc.)
+        are still set with setattr
+
+        Args:
+            values_dicts (Iterable[Dict[str, Any]]): dicts of variables and values
+
+        Returns:
+            List[DeclarativeBase]: objs created from the dicts
+        """
+        mapper = cls.__mapper__
+        ## validators are set listeners too
+        column_keys = frozenset(
+            k
+            for k in mapper.column_attrs.keys()
+            if not mapper.class_manager[k].dispatch.set
+        )
+        instances = []
+        for values_dict in values_dicts:
+            instance = cls()
+            instance_dict = instance.__dict__
+            for k, v in values_dict.items():
+                if k in column_keys:
+                    instance_dict[k] = v
+                else:
+                    setattr(instance, k, v)
+            instances.append(instance)
+        return instances
+
     def __repr__(self):
-        cols = [*self._key_columns, *self._log_columns]
-        cols = list(set([col.name for col in cols]))
-        d = set(dir(self.__class__))
-        remove = ["metadata", "registry", *cols]
-        d.difference_update(remove)
-        cols.extend(sorted(list(d)))
-        l = [
-            f"{var}={getattr(self, var)}"
-            for var in cols
-            if not callable(getattr(self.__class__, var)) and not var.startswith("_")
-        ]
-        ## ex <class 'tests.models.models.TClass'>
-        clsname = self.__class__.__name__.split(".")[-1]
-        return f"{clsname}({','.join(l)})"
+        cls = self.__class__
+        ## made on first use, checking cls.__dict__ so subclasses get their own
+        if "_repr_fields" not in cls.__dict__:
+            cls._make_repr_fields()
+        l = [f"{var}={getattr(self, var)}" for var in self._repr_fields]
+        return f"{self._repr_prefix}({','.join(l)})"
+
+
+@event.listens_for(DeclarativeBase, "instrument_class", propagate=True)
+def _on_instrument_class(mapper: orm.Mapper, cls: Type[DeclarativeBase]) -> None:
+    cls._freeze_columns()
 
 
 class Registry:
@@ -171,11 +352,12 @@ class Registry:
 
     ## _fk_referred_from : A nested dict object that will return a Relationship
     ## When given a tablename(start) and the desired target class(end)
-    _fk_referred_from: Dict[str, Dict[Type[DeclarativeBase], Dict]] = defaultdict(
-        lambda: defaultdict(dict)
-    )
-    _columns2name = {}
+    ## Classes are weakly referenced so dynamically made classes can be collected
+    _fk_referred_from: Dict[str, Dict[Type[DeclarativeBase], Dict]] = {}
+    ## _columns2name : Column -> (weakref to the class, attribute name)
+    _columns2name: Dict[Column, Tuple[weakref.ref, str]] = weakref.WeakKeyDictionary()
 
+    @staticmethod
     def get_relationships(
         start_class_table_name: str, end_class: Type[DeclarativeBase]
     ) -> Iterable[Relationship]:
@@ -188,7 +370,14 @@ class Registry:
         Returns:
             Iterable[Relationship]: Relationships
         """
-        return Registry._fk_referred_from[start_class_table_name][end_class].values()
+        ## cached on end_class, its foreign keys are registered when it is made.
+        ## Uses .get so that unknown tables or classes aren't added to the registry
+        cache = end_class._class_cache()
+        key = ("relationships", start_class_table_name)
+        if key not in cache:
+            rels = Registry._fk_referred_from.get(start_class_table_name, {})
+            cache[key] = tuple(rels.get(end_class, {}).values())
+        return cache[key]
 
 
 def declarative_base(*args, **kwargs) -> Any:
@@ -1,30 +1,303 @@
 """Module for all of the extensions to the SQLAlchemy session class """
+import io
 from collections.abc import Iterable as CollectionsIterable
 from collections.abc import Sequence
-from functools import partial
-from typing import Any, Iterable, List, Optional, Set, Tuple, Type, Union
-
-from sqlalchemy import func, select
-from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import Session, sessionmaker
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+
+from sqlalchemy import and_, bindparam, func, inspect, select, types
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached, sessionmaker
+from sqlalchemy.orm.attributes import (
+    INCLUDE_PENDING_MUTATIONS,
+    PASSIVE_NO_INITIALIZE,
+    get_history,
+    set_committed_value,
+)
+from sqlalchemy.engine import Row
 from sqlalchemy.orm.interfaces import ORMOption
-from sqlalchemy.sql import tuple_
+from sqlalchemy.schema import (
+    Column,
+    PrimaryKeyConstraint,
+    Table,
+    UniqueConstraint,
+)
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import Tuple as SQLTuple
 
 from sqlalchemy_extensions import NoLogicalKeyException
 from sqlalchemy_extensions.orm.decl_base import DeclarativeBase, Registry
 
 
-def _eq_filter(l1: List, l2: List) -> List[bool]:
-    """Given two lists, compare the
+def _prepare_key_stmt(
+    obj_class: Type[DeclarativeBase], columns: Tuple[Column, ...]
+) -> Select:
+    """Make a select of obj_class filtered on each column equal to a bindparam
+    named by the column key. Cached on the class so the same statement object
+    is reused and SQLAlchemy's compiled cache is hit without rebuilding the clauses
+
+    Args:
+        obj_class (Type[DeclarativeBase]): class to select
+        columns (Tuple[Column, ...]): columns to filter on
+
+    Returns:
+        Select: the select statement
+    """
+    cache = obj_class._class_cache()
+    key = ("key_stmt", columns)
+    if key not in cache:
+        cache[key] = select(obj_class).where(
+            and_(*[c == bindparam(c.key) for c in columns])
+        )
+    return cache[key]
+
+
+def _prepare_find_keys_stmt(obj_class: Type[DeclarativeBase]) -> Select:
+    """Make a select of the primary key columns of obj_class filtered on each
+    logical key column equal to a bindparam named by the column key.
+    Cached on the class like _prepare_key_stmt
+
+    Args:
+        obj_class (Type[DeclarativeBase]): class with logical key columns
+
+    Returns:
+        Select: the select statement
+    """
+    cache = obj_class._class_cache()
+    if "find_keys_stmt" not in cache:
+        cache["find_keys_stmt"] = select(*obj_class._key_columns).where(
+            and_(*[c == bindparam(c.key) for c in obj_class._log_columns])
+        )
+    return cache["find_keys_stmt"]
+
+
+def _key_params(columns: Sequence[Column], values: Iterable[Any]) -> Dict[str, Any]:
+    """Get the bindparam values for a statement made with _prepare_key_stmt
+
+    Args:
+        columns (Sequence[Column]): columns the statement filters on
+        values (Iterable[Any]): values for the columns
+
+    Returns:
+        Dict[str, Any]: column key to value
+    """
+    return {c.key: v for c, v in zip(columns, values)}
+
+
+def _tuple_identity(values: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    return values
+
+
+def _bind_values_getter(
+    obj_class: Type[DeclarativeBase], columns: Tuple[Column, ...], dialect: Any
+) -> Callable[[Tuple[Any, ...]], Tuple[Any, ...]]:
+    """Make a function that converts values of columns with the column types'
+    bind processors, so values match the rows read back from the db as the db
+    stores them, e.g. a timezone aware datetime and the naive one SQLite returns.
+    Cached on the class like _prepare_key_stmt
+
+    Args:
+        obj_class (Type[DeclarativeBase]): mapped class
+        columns (Tuple[Column, ...]): columns of the values
+        dialect (Any): dialect of the bind
+
+    Returns:
+        Callable[[Tuple[Any, ...]], Tuple[Any, ...]]: values to processed values
+    """
+    cache = obj_class._class_cache()
+    key = ("bind_values", columns, dialect)
+    if key not in cache:
+        processors = [
+            c.type.dialect_impl(dialect).bind_processor(dialect) for c in columns
+        ]
+        if not any(processors):
+            cache[key] = _tuple_identity
+        else:
+
+            def bind_values(values: Tuple[Any, ...]) -> Tuple[Any, ...]:
+                return tuple(
+                    proc(v) if proc and v is not None else v
+                    for proc, v in zip(processors, values)
+                )
+
+            cache[key] = bind_values
+    return cache[key]
+
+
+## dialects with INSERT ... ON CONFLICT DO NOTHING / DO UPDATE
+_ON_CONFLICT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+_UNIQUE_CONSTRAINTS = (PrimaryKeyConstraint, UniqueConstraint)
+
+
+def _has_unique(table: Table, columns: Sequence[Column]) -> bool:
+    """Whether a unique index or constraint covers exactly the given columns
+
+    Args:
+        table (Table): table to check
+        columns (Sequence[Column]): columns that should be unique together
+
+    Returns:
+        bool: True if there is a matching unique index or constraint
+    """
+    cols = set(columns)
+    uniques = [
+        *(c for c in table.constraints if isinstance(c, _UNIQUE_CONSTRAINTS)),
+        *(i for i in table.indexes if i.unique),
+    ]
+    return any(set(u.columns) == cols for u in uniques)
+
+
+def _needs_flush(obj_class: Type[DeclarativeBase]) -> bool:
+    """Whether objects of the class have to be inserted with a flush.
+    The Core inserts only write obj.__table__, so they would skip the base table
+    row of an inheriting class, and only the unit of work runs the mapper's
+    before_insert and after_insert listeners
+
+    Args:
+        obj_class (Type[DeclarativeBase]): mapped class
+
+    Returns:
+        bool: True if objects of the class need to be inserted with a flush
+    """
+    mapper = inspect(obj_class)
+    dispatch = mapper.dispatch
+    return (
+        mapper.inherits is not None
+        or bool(dispatch.before_insert)
+        or bool(dispatch.after_insert)
+    )
+
+
+## bound parameters per tuple_(...).in_(...) lookup, larger lookups are chunked
+DEFAULT_MAX_IN_PARAMS = 10000
+_MAX_IN_PARAMS = {"sqlite": 999, "mssql": 2000, "oracle": 1000}
+
+## minimum number of new objects before linsert_ignore_all uses COPY on PostgreSQL
+COPY_THRESHOLD = 1000
+## PostgreSQL drivers with a COPY ... FROM STDIN cursor api
+_COPY_DRIVERS = {"psycopg2", "psycopg"}
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+## column types whose bind values _copy_text_value formats as PostgreSQL reads
+## them, e.g. ARRAY, JSON or Interval columns are inserted without COPY
+_COPY_TYPES = (
+    types.Integer,
+    types.Numeric,
+    types.String,
+    types.Boolean,
+    types.Date,
+    types.DateTime,
+    types.Time,
+    types.Uuid,
+)
+
+
+def _copy_text_value(value: Any) -> str:
+    """Format a value for COPY ... FROM STDIN in the text format. Only for the
+    values of the scalar _COPY_TYPES columns
+
+    Args:
+        value (Any): value after the column type's bind processing
+
+    Returns:
+        str: the escaped value, or \\N for None
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def _copy_columns_supported(table: Table, col_keys: Sequence[str]) -> bool:
+    """Whether all the columns can be inserted with COPY, see _COPY_TYPES
+
+    Args:
+        table (Table): table to insert into
+        col_keys (Sequence[str]): keys of the columns that are set
+
+    Returns:
+        bool: True if every column type is one of _COPY_TYPES
+    """
+    return all(isinstance(table.c[k].type, _COPY_TYPES) for k in col_keys)
+
+
+def _column_attr_keys(
+    obj_class: Type[DeclarativeBase],
+) -> Tuple[Tuple[Column, str], ...]:
+    """Get the columns of obj_class with the key of the attribute mapping each.
+    The attribute key differs from the column name for e.g.
+    nm = mapped_column("name"). Cached on the class like _prepare_key_stmt
+
+    Args:
+        obj_class (Type[DeclarativeBase]): mapped class
+
+    Returns:
+        Tuple[Tuple[Column, str], ...]: (column, attribute key) pairs
+    """
+    cache = obj_class._class_cache()
+    if "column_attr_keys" not in cache:
+        mapper = inspect(obj_class)
+        cache["column_attr_keys"] = tuple(
+            (c, mapper.get_property_by_column(c).key) for c in obj_class._all_columns
+        )
+    return cache["column_attr_keys"]
+
+
+def _insert_params(obj: DeclarativeBase) -> Dict[str, Any]:
+    """Get the insert parameters for the columns that have been set on obj.
+    Unset columns, and primary keys set to None, are left out so that
+    column defaults and autoincrement apply as they would for a flush
+
+    Args:
+        obj (DeclarativeBase): valid db obj
+
+    Returns:
+        Dict[str, Any]: column key to value
+    """
+    d = obj.__dict__
+    return {
+        c.key: d[k]
+        for c, k in _column_attr_keys(obj.__class__)
+        if k in d and not (c.primary_key and d[k] is None)
+    }
+
+
+def _group_insert_params(
+    objects: Iterable[DeclarativeBase],
+) -> Dict[Tuple[str, ...], Tuple[List[DeclarativeBase], List[Dict[str, Any]]]]:
+    """Group objects by the columns that are set, each group is one executemany
 
     Args:
-        l1 (List): list1 to compare
-        l2 (List): list2 to compare
+        objects (Iterable[DeclarativeBase]): valid db objects of one class
 
     Returns:
-        List[bool]: list of bool equalities
+        Dict[Tuple[str, ...], Tuple[List, List]]: column keys to (objects, params)
     """
-    return [x == y for x, y in zip(l1, l2)]
+    groups = {}
+    for o in objects:
+        params = _insert_params(o)
+        group_objs, group_params = groups.setdefault(tuple(params), ([], []))
+        group_objs.append(o)
+        group_params.append(params)
+    return groups
+
+
+## insertmanyvalues page sizes for the Core executemany inserts of new objects
+_CORE_INSERT_PAGE_SIZES = {"mssql": 500, "oracle": 1000}
 
 
 class SessionExtensions(Session):
@@ -76,10 +349,14 @@ class SessionExtensions(Session):
         Returns:
             Tuple[Iterable[DeclarativeBase], Iterable[bool]]: _description_
         """
-
-        obj = next(iter(objects))
+        if not isinstance(objects, (list, tuple)):
+            objects = list(objects)
+        if not objects:
+            return []
+        obj = objects[0]
         if not obj._log_columns:
             raise NoLogicalKeyException(obj.__class__)
+        key_names = obj._key_names
         oids = self.find_keys_all(obj.__class__, [o._log_vals for o in objects])
         attached_key_list = []
         for oids, obj in zip(oids, objects):
@@ -87,11 +364,11 @@ class SessionExtensions(Session):
             if oids is None:
                 attached_key_list.append(attached_key)
                 continue
-            for col, oid in zip(obj._key_columns, oids):
+            for name, oid in zip(key_names, oids):
                 if oid is not None:
                     if not attached_key:
                         attached_key = True
-                    setattr(obj, col.name, oid)
+                    setattr(obj, name, oid)
             attached_key_list.append(attached_key)
         return attached_key_list
 
@@ -106,6 +383,39 @@ class SessionExtensions(Session):
         """
         return self.scalar(select(func.count()).select_from(cls))
 
+    def _select_in(
+        self,
+        obj_class: Type[DeclarativeBase],
+        columns: Sequence[Any],
+        in_expr: SQLTuple,
+        values: List[Tuple[Any]],
+        execution_options: Optional[Dict[str, Any]] = None,
+    ) -> List[Row]:
+        """Select columns where in_expr, a tuple_(...) of columns, is in values.
+        The IN list is split into chunks that respect the dialect's bound
+        parameter limit
+
+        Args:
+            obj_class (Type[DeclarativeBase]): class used to find the bind
+            columns (Sequence[Any]): columns or entities to select
+            in_expr (SQLTuple): tuple_ of the columns compared against values,
+                e.g. the class's _key_tuple or _log_tuple
+            values (List[Tuple[Any]]): tuples of values for in_columns
+            execution_options (Optional[Dict[str, Any]], optional):
+                execution options for each select. Defaults to None.
+
+        Returns:
+            List[Row]: rows from all chunks
+        """
+        dialect = self.get_bind(mapper=obj_class).dialect
+        max_params = _MAX_IN_PARAMS.get(dialect.name, DEFAULT_MAX_IN_PARAMS)
+        chunk_size = max(1, max_params // len(in_expr.clauses))
+        rows = []
+        for i in range(0, len(values), chunk_size):
+            stmt = select(*columns).filter(in_expr.in_(values[i : i + chunk_size]))
+            rows.extend(self.execute(stmt, execution_options=execution_options))
+        return rows
+
     def _commit_flush_refresh(
         self,
         commit: bool = False,
@@ -119,8 +429,24 @@ class SessionExtensions(Session):
             self.flush()
         if refresh:
             if isinstance(instances, CollectionsIterable):
+                ## one select per class instead of a refresh per object,
+                ## populate_existing overwrites the loaded instances in place.
+                ## The identity holds the keys without loading expired attributes
+                by_class = {}
                 for o in instances:
-                    self.refresh(o)
+                    state = inspect(o)
+                    if state.persistent:
+                        by_class.setdefault(o.__class__, []).append(state.identity)
+                    else:
+                        self.refresh(o)  # raises the usual not persistent error
+                for cls, key_vals in by_class.items():
+                    self._select_in(
+                        cls,
+                        (cls,),
+                        cls._key_tuple,
+                        key_vals,
+                        execution_options={"populate_existing": True},
+                    )
             else:
                 self.refresh(instances)
 
@@ -139,22 +465,31 @@ class SessionExtensions(Session):
             Union[Any, Tuple[Any]]: primary key/s or None
         """
 
-        if not isinstance(logical_values, Sequence):
-            logical_values = [logical_values]
+        ## a single value, strings are iterable but are still one value
+        if isinstance(logical_values, (str, bytes)) or not isinstance(
+            logical_values, CollectionsIterable
+        ):
+            logical_values = (logical_values,)
+        else:
+            logical_values = tuple(logical_values)
         if not obj_class._log_columns:
             raise NoLogicalKeyException(obj_class)
+        ## the logical key is the primary key, check the identity map first
+        if obj_class._log_names == obj_class._key_names and None not in logical_values:
+            if self.get(obj_class, logical_values) is None:
+                return None
+            return logical_values[0] if len(logical_values) == 1 else logical_values
+        stmt = _prepare_find_keys_stmt(obj_class)
+        params = _key_params(obj_class._log_columns, logical_values)
         try:
-            stmt = select(*obj_class._key_columns).where(
-                tuple_(*obj_class._log_columns).in_([logical_values])
-            )
-            v = self.execute(stmt).one_or_none()
-            return v[0] if v is not None and len(v) == 1 else v
+            v = self.execute(stmt, params).one_or_none()
         except Exception as e:
             e.add_note(
-                f"stmt={stmt}\nobj._log_columns={obj_class._log_columns}, "
+                f"stmt={stmt}\nobj._log_names={obj_class._log_names}, "
                 f"obj._log_vals={logical_values}"
             )
             raise
+        return v[0] if v is not None and len(v) == 1 else v
 
     def find_keys_all(
         self,
@@ -173,17 +508,27 @@ class SessionExtensions(Session):
 
         if not obj_class._log_columns:
             raise NoLogicalKeyException(obj_class)
-
-        stmt = select(*obj_class._key_columns, *obj_class._log_columns).filter(
-            tuple_(*obj_class._log_columns).in_(logical_values)
+        if not isinstance(logical_values, (list, tuple)):
+            logical_values = list(logical_values)
+
+        db_ids_log_vals = self._select_in(
+            obj_class,
+            (*obj_class._key_columns, *obj_class._log_columns),
+            obj_class._log_tuple,
+            ## repeated logical values only need to be sent once
+            list(dict.fromkeys(logical_values)),
         )
-        db_ids_log_vals = self.execute(stmt).all()
 
+        ## compared as the db stores them, the rows can differ from the values
+        dialect = self.get_bind(mapper=obj_class).dialect
+        bind_values = _bind_values_getter(obj_class, obj_class._log_columns, dialect)
         nkeys = len(obj_class._key_columns)
-        logvals_to_keyvals = {tuple(x[nkeys:]): x[:nkeys] for x in db_ids_log_vals}
+        logvals_to_keyvals = {
+            bind_values(x[nkeys:]): x[:nkeys] for x in db_ids_log_vals
+        }
 
         ## get what objects were found and not found in db
-        return [logvals_to_keyvals.get(lv, None) for lv in logical_values]
+        return [logvals_to_keyvals.get(bind_values(lv), None) for lv in logical_values]
 
     def _handle_relationships(
         self,
@@ -206,7 +551,7 @@ class SessionExtensions(Session):
             classes_seen (Set[DeclarativeBase]): set of already seen classes to avoid
                 adding already handled classes
         """
-        obj = next(iter(objects))
+        obj = objects[0]
 
         for rcol_str, rcol in obj._rel_columns.items():
             toinsertobjects = []
@@ -215,25 +560,45 @@ class SessionExtensions(Session):
             if rclass in classes_seen:
                 continue
             classes_seen.add(rclass)
+            ### the child columns to update are the same for every parent
+            rel_pairs = [
+                (r.end_col, r.start_col)
+                for r in Registry.get_relationships(obj.__tablename__, rclass)
+            ]
+            ### scalar or collection is known from the mapped relationship
+            uselist = rcol.uselist
             for parentobj in objects:
+                ## an unloaded relationship, e.g. expired by a commit, is what
+                ## the db already has, loading it would be a select per parent.
+                ## Backref appends to it are pending mutations, which the
+                ## history only includes with INCLUDE_PENDING_MUTATIONS
+                if (
+                    rcol_str in inspect(parentobj).unloaded
+                    and not get_history(
+                        parentobj,
+                        rcol_str,
+                        passive=PASSIVE_NO_INITIALIZE | INCLUDE_PENDING_MUTATIONS,
+                    ).added
+                ):
+                    continue
                 instance_or_list = getattr(parentobj, rcol_str)
                 if not instance_or_list:
                     continue
-                if not isinstance(instance_or_list, CollectionsIterable):
+                if not uselist:
                     instance_or_list = [instance_or_list]
-                ### I have my column of children to update
-                ### Now I need the child class, and all of the child columns to update
-                fk_relationships = Registry.get_relationships(
-                    parentobj.__tablename__, next(iter(instance_or_list)).__class__
-                )
                 childcol_parentvalues = [
-                    (r.end_col, getattr(parentobj, r.start_col))
-                    for r in fk_relationships
+                    (end_col, getattr(parentobj, start_col))
+                    for end_col, start_col in rel_pairs
                 ]
                 # Set the parent value to all the objects
+                # transient objects are inserted with every value in their dict,
+                # so the history and events from setattr aren't needed
                 for childobj in instance_or_list:
+                    setter = (
+                        set_committed_value if inspect(childobj).transient else setattr
+                    )
                     for childcol, parentvalue in childcol_parentvalues:
-                        setattr(childobj, childcol, parentvalue)
+                        setter(childobj, childcol, parentvalue)
                 toinsertobjects.extend(instance_or_list)
 
             insert_func(
@@ -265,25 +630,66 @@ class SessionExtensions(Session):
         Returns:
             List[DeclarativeBase]: All objects (with primary keys) from the db
         """
+        if not isinstance(objects, (list, tuple)):
+            objects = list(objects)
         if not objects:
             return objects
 
-        obj = next(iter(objects))
+        obj = objects[0]
+
+        ## Single INSERT ... ON CONFLICT DO NOTHING when the ORM isn't needed
+        ## for relationships, inheritance or insert listeners and the objects
+        ## aren't in a session yet
+        dialect = self.get_bind(mapper=obj.__class__).dialect
+        if (
+            dialect.name in _ON_CONFLICT_INSERTS
+            and dialect.insert_executemany_returning
+            and not obj._rel_columns
+            and not _needs_flush(obj.__class__)
+            and all(inspect(o).transient for o in objects)
+        ):
+            inserted_objs = self._insert_on_conflict_do_nothing(
+                _ON_CONFLICT_INSERTS[dialect.name], objects
+            )
+            if commit or flush or refresh:
+                self._commit_flush_refresh(commit, flush, refresh, inserted_objs)
+            return objects
 
         ## get ids that were in the database
         # Example: .in_([('0', '0'), ('1', '1')])
-        db_ids_key_vals = self.execute(
-            select(*obj._key_columns).filter(
-                tuple_(*obj._key_columns).in_([x._key_vals for x in objects])
+        key_vals = [o._key_vals for o in objects]
+        ## Rows hash and compare like tuples, no need to copy them
+        db_ids_key_vals = set(
+            self._select_in(
+                obj.__class__,
+                obj._key_columns,
+                obj._key_tuple,
+                key_vals,
             )
-        ).all()
+        )
 
-        ## get what objects were found and not found in db
-        not_found_objs = [o for o in objects if o._key_vals not in db_ids_key_vals]
+        ## get what objects were found and not found in db, a key repeated in
+        ## objects is only inserted once. Unset keys are generated so never repeat
+        not_found_objs = []
+        for o, kv in zip(objects, key_vals):
+            if None in kv:
+                not_found_objs.append(o)
+            elif kv not in db_ids_key_vals:
+                db_ids_key_vals.add(kv)
+                not_found_objs.append(o)
 
         ## Add in whatever objects were not found
+        ## the unit of work is only needed for relationships, inheritance and
+        ## insert listeners
         if not_found_objs:
-            self.add_all(not_found_objs)
+            if (
+                not obj._rel_columns
+                and not _needs_flush(obj.__class__)
+                and all(inspect(o).transient for o in not_found_objs)
+            ):
+                self._insert_core(not_found_objs)
+            else:
+                self.add_all(not_found_objs)
         if commit or flush or refresh:
             self._commit_flush_refresh(commit, flush, refresh, not_found_objs)
         ## Handle Relationships
@@ -304,6 +710,203 @@ class SessionExtensions(Session):
 
         return objects
 
+    def _insert_on_conflict_do_nothing(
+        self,
+        dialect_insert: Any,
+        objects: List[DeclarativeBase],
+        logical: bool = False,
+    ) -> List[DeclarativeBase]:
+        """Insert transient objects with INSERT ... ON CONFLICT DO NOTHING on the
+        primary key, or the logical key, set any generated keys on the objects,
+        and attach the inserted objects to the session as persistent.
+
+        Args:
+            dialect_insert (Any): dialect insert() supporting on_conflict_do_nothing
+            objects (List[DeclarativeBase]): transient objects of one class
+            logical (bool, optional): conflict on the logical key columns, which
+                need a unique index or constraint. Defaults to False.
+
+        Returns:
+            List[DeclarativeBase]: the objects that were inserted
+        """
+        obj = objects[0]
+        table = obj.__table__
+        key_cols = obj._key_columns
+        key_names = obj._key_names
+        nkeys = len(key_cols)
+        conflict_cols = obj._log_columns if logical else key_cols
+
+        ## the returned values are matched as the db stores them
+        dialect = self.get_bind(mapper=obj.__class__).dialect
+        bind_values = _bind_values_getter(obj.__class__, conflict_cols, dialect)
+        groups = _group_insert_params(objects)
+        inserted_objs = []
+        for group_objs, group_params in groups.values():
+            if logical or None not in group_objs[0]._key_vals:
+                ## RETURNING says which rows weren't conflicts and their keys
+                stmt = (
+                    dialect_insert(table)
+                    .on_conflict_do_nothing(index_elements=conflict_cols)
+                    .returning(*key_cols, *conflict_cols)
+                )
+                new_rows = {
+                    bind_values(r[nkeys:]): r[:nkeys]
+                    for r in self.execute(stmt, group_params)
+                }
+                for o in group_objs:
+                    vals = bind_values(o._log_vals if logical else o._key_vals)
+                    keyvals = new_rows.pop(vals, None)
+                    if keyvals is not None:
+                        for name, value in zip(key_names, keyvals):
+                            setattr(o, name, value)
+                        inserted_objs.append(o)
+            else:
+                ## keys are generated so there is nothing to conflict with
+                stmt = dialect_insert(table).returning(
+                    *key_cols, sort_by_parameter_order=True
+                )
+                for o, row in zip(group_objs, self.execute(stmt, group_params)):
+                    for name, value in zip(key_names, row):
+                        setattr(o, name, value)
+                    inserted_objs.append(o)
+
+        for o in inserted_objs:
+            make_transient_to_detached(o)
+            self.add(o)
+        return inserted_objs
+
+    def _can_upsert(self, objects: List[DeclarativeBase]) -> bool:
+        """Whether linsert_update can use INSERT ... ON CONFLICT DO UPDATE for objects.
+        They need to be transient with unset keys, have distinct complete logical
+        values covered by a unique index, and no relationships, inheritance or
+        insert and update listeners to handle
+
+        Args:
+            objects (List[DeclarativeBase]): valid db objects of one class
+
+        Returns:
+            bool: True if _insert_on_conflict_do_update can insert the objects
+        """
+        obj = objects[0]
+        dialect = self.get_bind(mapper=obj.__class__).dialect
+        dispatch = inspect(obj.__class__).dispatch
+        if (
+            dialect.name not in _ON_CONFLICT_INSERTS
+            or not dialect.insert_executemany_returning
+            or obj._rel_columns
+            or _needs_flush(obj.__class__)
+            or dispatch.before_update
+            or dispatch.after_update
+            or not obj._log_columns
+            or not _has_unique(obj.__table__, obj._log_columns)
+        ):
+            return False
+        log_vals = set()
+        for o in objects:
+            lv = o._log_vals
+            if (
+                None in lv
+                or lv in log_vals
+                or any(k is not None for k in o._key_vals)
+                or not inspect(o).transient
+            ):
+                return False
+            log_vals.add(lv)
+        return True
+
+    def _insert_on_conflict_do_update(
+        self, dialect_insert: Any, objects: List[DeclarativeBase]
+    ) -> List[DeclarativeBase]:
+        """Insert transient objects with INSERT ... ON CONFLICT (logical key)
+        DO UPDATE, setting the columns the objects have set on the rows that
+        already exist. The keys of the inserted or updated rows are set on the
+        objects. Objects whose row isn't in the session are attached as persistent,
+        an instance already in the session for the row is expired instead.
+
+        Args:
+            dialect_insert (Any): dialect insert() supporting on_conflict_do_update
+            objects (List[DeclarativeBase]): transient objects of one class
+                accepted by _can_upsert
+
+        Returns:
+            List[DeclarativeBase]: the objects that were attached to the session
+        """
+        obj = objects[0]
+        cls = obj.__class__
+        table = obj.__table__
+        key_cols = obj._key_columns
+        key_names = obj._key_names
+        log_cols = obj._log_columns
+
+        attached_objs = []
+        for group_objs, group_params in _group_insert_params(objects).values():
+            stmt = dialect_insert(table)
+            ## the logical columns are always set, so there is something to
+            ## update and RETURNING has a row for every object, in their order
+            stmt = stmt.on_conflict_do_update(
+                index_elements=log_cols,
+                set_={k: stmt.excluded[k] for k in group_params[0]},
+            ).returning(*key_cols, sort_by_parameter_order=True)
+            rows = self.execute(stmt, group_params)
+            for o, keyvals in zip(group_objs, rows):
+                for name, value in zip(key_names, keyvals):
+                    setattr(o, name, value)
+                existing = self.identity_map.get(self.identity_key(cls, tuple(keyvals)))
+                if existing is not None:
+                    self.expire(existing)
+                else:
+                    make_transient_to_detached(o)
+                    self.add(o)
+                    attached_objs.append(o)
+        return attached_objs
+
+    def _insert_core(self, objects: List[DeclarativeBase]) -> List[DeclarativeBase]:
+        """Insert transient objects with Core executemany inserts instead of the
+        unit of work, set any generated keys on the objects, and attach them
+        to the session as persistent. Objects with generated keys are added
+        to the session instead if the dialect can't return them for an executemany
+
+        Args:
+            objects (List[DeclarativeBase]): transient objects of one class
+
+        Returns:
+            List[DeclarativeBase]: the objects that were inserted with Core
+        """
+        obj = objects[0]
+        table = obj.__table__
+        key_cols = obj._key_columns
+        key_names = obj._key_names
+        dialect = self.get_bind(mapper=obj.__class__).dialect
+        execution_options = {}
+        if dialect.name in _CORE_INSERT_PAGE_SIZES:
+            execution_options["insertmanyvalues_page_size"] = _CORE_INSERT_PAGE_SIZES[
+                dialect.name
+            ]
+
+        inserted_objs = []
+        for group_objs, group_params in _group_insert_params(objects).values():
+            if None not in group_objs[0]._key_vals:
+                self.execute(
+                    table.insert(), group_params, execution_options=execution_options
+                )
+                inserted_objs.extend(group_objs)
+            elif dialect.insert_executemany_returning_sort_by_parameter_order:
+                stmt = table.insert().returning(*key_cols, sort_by_parameter_order=True)
+                rows = self.execute(
+                    stmt, group_params, execution_options=execution_options
+                )
+                for o, row in zip(group_objs, rows):
+                    for name, value in zip(key_names, row):
+                        setattr(o, name, value)
+                    inserted_objs.append(o)
+            else:
+                self.add_all(group_objs)
+
+        for o in inserted_objs:
+            make_transient_to_detached(o)
+            self.add(o)
+        return inserted_objs
+
     def insert_ignore(
         self,
         obj: Union[DeclarativeBase, Iterable[DeclarativeBase]],
@@ -312,6 +915,7 @@ class SessionExtensions(Session):
         flush: bool = False,
         refresh: bool = False,
         classes_seen: Set[Type[DeclarativeBase]] = None,
+        optimistic: bool = False,
     ) -> DeclarativeBase:
         """insert the object if it is not already in the db
 
@@ -319,6 +923,11 @@ class SessionExtensions(Session):
             obj (DeclarativeBase): valid db obj
             commit (bool, optional): commit to the db. Defaults to False.
             flush (bool, optional): flush the db. Defaults to False.
+            optimistic (bool, optional): skip the select and insert inside a
+                SAVEPOINT, loading the existing row on an IntegrityError.
+                Fewer round trips when duplicates are rare, more when they
+                are common. Pending objects are flushed before it.
+                Defaults to False.
 
         Returns:
             DeclarativeBase: _description_
@@ -333,11 +942,25 @@ class SessionExtensions(Session):
                 refresh=refresh,
                 classes_seen=classes_seen,
             )
-        stmt = select(obj.__class__).where(*_eq_filter(obj._key_columns, obj._key_vals))
-        try:
-            return self.scalars(stmt).one_or_none()
-        except NoResultFound:
-            pass
+        key_vals = obj._key_vals
+        if None not in key_vals and optimistic:
+            ## flushed first so errors of other pending objects aren't taken as
+            ## this object's conflict
+            self.flush()
+            try:
+                with self.begin_nested():
+                    self.add(obj, _warn=_warn)
+            except IntegrityError:
+                ## no row with the key, the error was something else
+                existing = self.get(obj.__class__, key_vals)
+                if existing is None:
+                    raise
+                return existing
+        elif None not in key_vals:
+            ## identity map hit, or a single select on the primary key
+            existing = self.get(obj.__class__, key_vals)
+            if existing is not None:
+                return existing
 
         self.add(obj, _warn=_warn)
         if commit or flush or refresh:
@@ -368,15 +991,39 @@ class SessionExtensions(Session):
         Returns:
             Any or None: id/ids (primary key/s values) of the object or None
         """
-        return self.find_keys(obj, obj._log_vals)
+        return self.find_keys(obj.__class__, obj._log_vals)
+
+    def lexists_all(self, objects: Iterable[DeclarativeBase]) -> List[Tuple[Any]]:
+        """Query to see which objects are in the db, with one chunked IN select
+        instead of a select per object. Use this over lexists in a loop
+
+        Args:
+            objects (Iterable[DeclarativeBase]): valid db objects of one class
+
+        Returns:
+            List[Tuple[Any]]: primary key values of each object, or None
+        """
+        if not isinstance(objects, (list, tuple)):
+            objects = list(objects)
+        if not objects:
+            return []
+        return self.find_keys_all(
+            objects[0].__class__, [o._log_vals for o in objects]
+        )
 
     def lget(
-        self, obj_class: Type[DeclarativeBase], values: Union[Any, Iterable[Any]]
+        self,
+        obj_class: Type[DeclarativeBase],
+        values: Union[Any, Iterable[Any]],
+        options: Optional[Sequence[ORMOption]] = None,
     ) -> DeclarativeBase:
         """Query to see if the object is in the db based on the logical keys
 
         Args:
             obj (Type[DeclarativeBase]): valid db obj
+            options (Optional[Sequence[ORMOption]], optional): loader options
+                for the select, e.g. selectinload(Cls.children) for one to many
+                or joinedload for many to one relationships. Defaults to None.
 
         Returns:
             DeclarativeBase Instance or None: The object with the given keys or None
@@ -385,12 +1032,15 @@ class SessionExtensions(Session):
             values = [values]
         if not obj_class._log_columns:
             raise NoLogicalKeyException(obj_class)
-        stmt = select(obj_class).where(*_eq_filter(obj_class._log_columns, values))
+        stmt = _prepare_key_stmt(obj_class, obj_class._log_columns)
+        if options:
+            stmt = stmt.options(*options)
+        params = _key_params(obj_class._log_columns, values)
         try:
-            return self.scalars(stmt).one_or_none()
+            return self.scalars(stmt, params).one_or_none()
         except Exception as e:
             e.add_note(
-                f"stmt={stmt}\nobj._log_columns={obj_class._log_columns}, "
+                f"stmt={stmt}\nobj._log_names={obj_class._log_names}, "
                 f"obj._log_vals={values}, "
             )
             raise
@@ -416,36 +1066,123 @@ class SessionExtensions(Session):
         Returns:
             List[DeclarativeBase]: All objects (with primary keys) from the db
         """
+        if not isinstance(objects, (list, tuple)):
+            objects = list(objects)
         if not objects:
             return objects
 
-        obj = next(iter(objects))
+        obj = objects[0]
         if not obj._log_columns:
             raise NoLogicalKeyException(obj.__class__)
+        key_cols = obj._key_columns
+        key_names = obj._key_names
+        ## each object's logical values, read once
+        log_vals = [o._log_vals for o in objects]
+
+        ## Single INSERT ... ON CONFLICT (logical key) DO NOTHING when the ORM
+        ## isn't needed, then one select for the keys of the rows that existed
+        dialect = self.get_bind(mapper=obj.__class__).dialect
+        if (
+            dialect.name in _ON_CONFLICT_INSERTS
+            and dialect.insert_executemany_returning
+            and not obj._rel_columns
+            and not _needs_flush(obj.__class__)
+            and _has_unique(obj.__table__, obj._log_columns)
+            and all(None not in lv for lv in log_vals)
+            and all(inspect(o).transient for o in objects)
+        ):
+            inserted_objs = self._insert_on_conflict_do_nothing(
+                _ON_CONFLICT_INSERTS[dialect.name], objects, logical=True
+            )
+            inserted = set(map(id, inserted_objs))
+            existing = [
+                (o, lv) for o, lv in zip(objects, log_vals) if id(o) not in inserted
+            ]
+            if existing:
+                existing_objs, existing_log_vals = zip(*existing)
+                keys = self.find_keys_all(obj.__class__, existing_log_vals)
+                unresolved = []
+                for o, keyvals in zip(existing_objs, keys):
+                    if keyvals is None:
+                        unresolved.append(o)
+                        continue
+                    for name, value in zip(key_names, keyvals):
+                        setattr(o, name, value)
+                ## neither RETURNING nor the select matched them, the unit of
+                ## work inserts them as it would have without ON CONFLICT
+                if unresolved:
+                    self.add_all(unresolved)
+                    inserted_objs.extend(unresolved)
+            if commit or flush or refresh:
+                self._commit_flush_refresh(commit, flush, refresh, inserted_objs)
+            return objects
+
         ## get ids that were in the database
         # Example: in_([('0', '0'), ('1', '1')])
-        stmt = select(*obj._key_columns, *obj._log_columns).filter(
-            tuple_(*obj._log_columns).in_([x._log_vals for x in objects])
+        db_ids_log_vals = self._select_in(
+            obj.__class__,
+            (*key_cols, *obj._log_columns),
+            obj._log_tuple,
+            ## repeated logical values only need to be sent once
+            list(dict.fromkeys(log_vals)),
         )
-        db_ids_log_vals = self.execute(stmt).all()
 
-        nkeys = len(obj._key_columns)
-        logvals_to_keyvals = {tuple(x[nkeys:]): x[:nkeys] for x in db_ids_log_vals}
+        ## compared as the db stores them, the rows can differ from the values
+        bind_values = _bind_values_getter(obj.__class__, obj._log_columns, dialect)
+        nkeys = len(key_cols)
+        logvals_to_keyvals = {
+            bind_values(x[nkeys:]): x[:nkeys] for x in db_ids_log_vals
+        }
 
         ## get what objects were found and not found in db
+        ## objects repeating a complete not found logical value are only inserted
+        ## once, the repeats get the keys of the first object once it is flushed.
+        ## A None can be a foreign key set on flush, so those are all inserted
+        not_found: Dict[Tuple[Any, ...], DeclarativeBase] = {}
         not_found_objs = []
-        for o in objects:
-            if o._log_vals in logvals_to_keyvals:
-                for kc, lv in zip(o._key_columns, logvals_to_keyvals[o._log_vals]):
-                    setattr(o, kc.name, lv)
+        aliases = []
+        for o, lv in zip(objects, log_vals):
+            keyvals = logvals_to_keyvals.get(bind_values(lv))
+            if keyvals is not None:
+                for name, kv in zip(key_names, keyvals):
+                    setattr(o, name, kv)
+            elif None in lv:
+                not_found_objs.append(o)
+            elif lv in not_found:
+                aliases.append((o, not_found[lv]))
             else:
+                not_found[lv] = o
                 not_found_objs.append(o)
         ## Add in whatever objects were not found
         if not_found_objs:
-            self.add_all(not_found_objs)
+            dialect = self.get_bind(mapper=obj.__class__).dialect
+            if (
+                len(not_found_objs) >= COPY_THRESHOLD
+                and dialect.name == "postgresql"
+                and dialect.driver in _COPY_DRIVERS
+                and not obj._rel_columns
+                and not _needs_flush(obj.__class__)
+                and all(inspect(o).transient for o in not_found_objs)
+            ):
+                if not self._copy_insert(not_found_objs):
+                    self._insert_core(not_found_objs)
+            elif (
+                not obj._rel_columns
+                and not _needs_flush(obj.__class__)
+                and all(inspect(o).transient for o in not_found_objs)
+            ):
+                self._insert_core(not_found_objs)
+            else:
+                self.add_all(not_found_objs)
 
         if commit or flush or refresh:
             self._commit_flush_refresh(commit, flush, refresh, not_found_objs)
+        if commit or flush:
+            ## the identity holds the keys without loading expired attributes
+            for o, first in aliases:
+                if o is not first:
+                    for name, kv in zip(key_names, inspect(first).identity):
+                        setattr(o, name, kv)
 
         ## Handle Relationships
         ## self.linsert_ignore is passed on purpose as it calls
@@ -464,6 +1201,65 @@ class SessionExtensions(Session):
             )
         return objects
 
+    def _copy_insert(self, objects: List[DeclarativeBase]) -> bool:
+        """Insert transient objects of one class with COPY ... FROM STDIN,
+        then get their primary keys from their logical keys and attach them
+        to the session as persistent. Only for the psycopg2 and psycopg drivers
+
+        Args:
+            objects (List[DeclarativeBase]): transient objects with logical keys
+
+        Returns:
+            bool: False if the objects can't be copied, they set different
+                columns, set columns that aren't _COPY_TYPES, share logical
+                keys or have None in them, and nothing was inserted
+        """
+        obj = objects[0]
+        table = obj.__table__
+        log_vals = [o._log_vals for o in objects]
+        params = [_insert_params(o) for o in objects]
+        col_keys = tuple(params[0])
+        if (
+            len(set(log_vals)) != len(objects)
+            or any(None in lv for lv in log_vals)
+            or any(tuple(p) != col_keys for p in params)
+            or not _copy_columns_supported(table, col_keys)
+        ):
+            return False
+
+        conn = self.connection(bind_arguments={"mapper": obj.__class__})
+        processors = [
+            table.c[k].type.dialect_impl(conn.dialect).bind_processor(conn.dialect)
+            for k in col_keys
+        ]
+        lines = []
+        for p in params:
+            values = [
+                proc(v) if proc else v for proc, v in zip(processors, p.values())
+            ]
+            lines.append("\t".join(_copy_text_value(v) for v in values))
+        data = "\n".join(lines) + "\n"
+
+        preparer = conn.dialect.identifier_preparer
+        columns = ", ".join(preparer.quote(table.c[k].name) for k in col_keys)
+        sql = f"COPY {preparer.format_table(table)} ({columns}) FROM STDIN"
+        cursor = conn.connection.cursor()
+        try:
+            if conn.dialect.driver == "psycopg2":
+                cursor.copy_expert(sql, io.StringIO(data))
+            else:
+                with cursor.copy(sql) as copy:
+                    copy.write(data)
+        finally:
+            cursor.close()
+
+        for o, keys in zip(objects, self.find_keys_all(obj.__class__, log_vals)):
+            for col, value in zip(o._key_columns, keys):
+                setattr(o, col.name, value)
+            make_transient_to_detached(o)
+            self.add(o)
+        return True
+
     def linsert_ignore(
         self,
         obj: Union[DeclarativeBase, Iterable[DeclarativeBase]],
@@ -472,6 +1268,7 @@ class SessionExtensions(Session):
         flush: bool = False,
         refresh: bool = False,
         classes_seen: Set[DeclarativeBase] = None,
+        options: Optional[Sequence[ORMOption]] = None,
     ) -> DeclarativeBase:
         """Logical insert_ignore, insert the object if it is not already in the db
 
@@ -479,6 +1276,8 @@ class SessionExtensions(Session):
             obj (DeclarativeBase): valid db obj
             commit (bool, optional): commit to the db. Defaults to False.
             flush (bool, optional): flush the db. Defaults to False.
+            options (Optional[Sequence[ORMOption]], optional): loader options
+                for the select of an existing object. Defaults to None.
 
         Returns:
             DeclarativeBase: _description_
@@ -495,11 +1294,13 @@ class SessionExtensions(Session):
             )
         if not obj._log_columns:
             raise NoLogicalKeyException(obj.__class__)
-        stmt = select(obj.__class__).where(*_eq_filter(obj._log_columns, obj._log_vals))
-        try:
-            return self.scalars(stmt).one()
-        except NoResultFound:
-            pass
+        stmt = _prepare_key_stmt(obj.__class__, obj._log_columns)
+        if options:
+            stmt = stmt.options(*options)
+        params = _key_params(obj._log_columns, obj._log_vals)
+        existing = self.scalars(stmt, params).first()
+        if existing is not None:
+            return existing
         self.add(obj, _warn=_warn)
         self._commit_flush_refresh(commit, flush, refresh, obj)
         ## Handle Relationships
@@ -527,6 +1328,29 @@ class SessionExtensions(Session):
         flush: bool = False,
         refresh: bool = False,
     ):
+        """Logical insert or update, insert the object or update the row with the
+        same logical values
+
+        Args:
+            obj (DeclarativeBase): valid db obj
+            load (bool, optional): merge loads the existing row. Defaults to True.
+            options (Optional[Sequence[ORMOption]], optional): loader options
+                for merge. Defaults to None.
+            commit (bool, optional): commit to the db. Defaults to False.
+            flush (bool, optional): flush the db. Defaults to False.
+
+        Returns:
+            DeclarativeBase: obj, with its primary keys when they were found
+        """
+        ## one INSERT ... ON CONFLICT DO UPDATE instead of a select and a merge
+        if self._can_upsert([obj]):
+            dialect = self.get_bind(mapper=obj.__class__).dialect
+            attached_objs = self._insert_on_conflict_do_update(
+                _ON_CONFLICT_INSERTS[dialect.name], [obj]
+            )
+            if commit or flush or refresh:
+                self._commit_flush_refresh(commit, flush, refresh, attached_objs)
+            return obj
         if any(key is None for key in obj._key_vals):
             attached_key = self.attach_keys(obj)
             if attached_key:
@@ -549,6 +1373,32 @@ class SessionExtensions(Session):
         flush: bool = False,
         refresh: bool = False,
     ):
+        """Logical insert or update of each object, see linsert_update
+
+        Args:
+            objs (Iterable[DeclarativeBase]): valid db objects of one class
+            load (bool, optional): merge loads the existing rows. Defaults to True.
+            options (Optional[Sequence[ORMOption]], optional): loader options
+                for merge. Defaults to None.
+            commit (bool, optional): commit to the db. Defaults to False.
+            flush (bool, optional): flush the db. Defaults to False.
+
+        Returns:
+            DeclarativeBase: the last object
+        """
+        if not isinstance(objs, (list, tuple)):
+            objs = list(objs)
+        if not objs:
+            return None
+        ## one INSERT ... ON CONFLICT DO UPDATE instead of a select and a merge each
+        if self._can_upsert(objs):
+            dialect = self.get_bind(mapper=objs[0].__class__).dialect
+            attached_objs = self._insert_on_conflict_do_update(
+                _ON_CONFLICT_INSERTS[dialect.name], objs
+            )
+            if commit or flush or refresh:
+                self._commit_flush_refresh(commit, flush, refresh, attached_objs)
+            return objs[-1]
         attached_list = self.attach_keys_all(objs)
         for obj, attached_key in zip(objs, attached_list):
             if attached_key:
@@ -563,58 +1413,45 @@ class SessionExtensions(Session):
 class extended_sessionmaker(sessionmaker):
     """Class to create an extended Session"""
 
-    def add_functions(self, session: Session) -> SessionExtensions:
-        """Add the functions
+    def __init__(
+        self,
+        bind: Any = None,
+        *,
+        class_: Type[Session] = SessionExtensions,
+        insertmanyvalues_page_size: Optional[int] = None,
+        **kw: Any,
+    ):
+        """Init for extended_sessionmaker. Sessions are made with class_, which
+        is combined with SessionExtensions if it isn't already a subclass
 
         Args:
-            session (Session): session object
-
-        Returns:
-            Session: session object
-        """
-
-        # fmt: off
-        session.attach_keys = partial(SessionExtensions.attach_keys, session)
-        session.attach_keys_all = partial(SessionExtensions.attach_keys_all, session)
-        session.count = partial(SessionExtensions.count, session)
-        session.find_keys = partial(SessionExtensions.find_keys, session)
-        session.find_keys_all = partial(SessionExtensions.find_keys_all, session)
-        session.insert_ignore = partial(SessionExtensions.insert_ignore, session)
-        session.insert_ignore_all = partial(SessionExtensions.insert_ignore_all, session)
-        session.lexists = partial(SessionExtensions.lexists, session)
-        session.lget = partial(SessionExtensions.lget, session)
-        session.linsert_ignore = partial(SessionExtensions.linsert_ignore, session)
-        session.linsert_ignore_all = partial(SessionExtensions.linsert_ignore_all, session)
-        session.linsert_update = partial(SessionExtensions.linsert_update, session)
-        session.linsert_update_all = partial(SessionExtensions.linsert_update_all, session)
-        session._handle_relationships = partial(SessionExtensions._handle_relationships, session)
-        session._commit_flush_refresh = partial(SessionExtensions._commit_flush_refresh, session)
-        # fmt: on
-        return session
-
-    def begin(self, nested: bool = False) -> SessionExtensions:
-        """begin function
-
-        Returns:
-            SessionExtensions: session extended with extra functions
+            bind (Any, optional): engine or connection for the sessions.
+                Defaults to None.
+            class_ (Type[Session], optional): session class.
+                Defaults to SessionExtensions.
+            insertmanyvalues_page_size (Optional[int], optional): rows per
+                batched INSERT for the sessions' executemany and ORM inserts.
+                Defaults to None, the engine's setting.
         """
-        s = super().begin()
-        return self.add_functions(s)
-
-    def begin_nested(self, nested: bool = False) -> SessionExtensions:
-        """begin function
+        if not issubclass(class_, SessionExtensions):
+            class_ = type(class_.__name__, (SessionExtensions, class_), {})
+        if bind is not None and insertmanyvalues_page_size is not None:
+            bind = bind.execution_options(
+                insertmanyvalues_page_size=insertmanyvalues_page_size
+            )
+        super().__init__(bind, class_=class_, **kw)
 
-        Returns:
-            SessionExtensions: session extended with extra functions
-        """
-        s = super().begin()
-        return self.add_functions(s)
+    def begin_nested(self, nested: bool = False) -> ContextManager[SessionExtensions]:
+        """Context manager for a new session with a transaction, like begin().
+        The transaction is committed on success and rolled back on an exception,
+        use session.begin_nested() inside it for SAVEPOINTs
 
-    def __call__(self, **local_kw: Any) -> SessionExtensions:
-        """__call__
+        Args:
+            nested (bool, optional): unused, kept for backwards compatibility.
+                Defaults to False.
 
         Returns:
-            SessionExtensions: session extended with extra functions
+            ContextManager[SessionExtensions]: yields a session extended with
+                extra functions
         """
-        s = super().__call__(**local_kw)
-        return self.add_functions(s)
+        return super().begin()
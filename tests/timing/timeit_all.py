@@ -1,90 +1,253 @@
+"""Timings for the session extensions against plain SQLAlchemy inserts.
+
+The per-object add and insert_ignore loops run inside one Session.begin()
+transaction, so a trial ends with a single commit instead of one per row.
+
+Trials run one after another, with --parallel they are spread over worker
+processes that each have their own in-memory database. That is faster, but the
+trials then compete for the machine, keep it serial for stable numbers.
+"""
+import argparse
+import json
 import statistics
 import timeit
-import uuid
-from sqlgold import create_db
-
-number = 2
-repeat = 20
-size = 10000
-setup = """
-size = {size}
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 
+from sqlalchemy import delete, event, insert
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy_extensions import Base, Session, sessionmaker
 from sqlgold import DB, create_db
-import warnings
-from sqlalchemy import exc as sa_exc
+
+from sqlalchemy_extensions import Base, sessionmaker
 
 DB.default_base = Base
 DB.default_sessionmaker = sessionmaker
 
+repeat = 7
+size = 10000
+page_size = 1000
+## rows in the discarded warmup trial, see warmup()
+warmup_size = 100
 
-class TClass{ext}(Base):
-    __tablename__ = "tclass_{ext}"
-    __table_args__ = {{'extend_existing': True}}
 
-    id{ext}: Mapped[int] = mapped_column(primary_key=True)
-    name{ext}: Mapped[int] = mapped_column(logical_key=True)
+class TClass(Base):
+    __tablename__ = "tclass"
+    __table_args__ = {"extend_existing": True}
 
-with warnings.catch_warnings():
-    warnings.simplefilter("ignore", category=sa_exc.SAWarning)
-    db = create_db("sqlite:///:memory:")
-    db.drop_all()
-    db.create_all()
-"""
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[int] = mapped_column(logical_key=True)
 
 
-def run(stmt, name):
-    """All of these extensions (ext) are to avoid mysql failing on trying to recreate
-    indexes.
-    """
-    
-    times = []
-    for r in range(repeat):
-        ext = uuid.uuid4().hex    
-        times.append(
-            timeit.timeit(
-                setup=setup.format(ext=ext, size=size),
-                stmt=stmt.format(ext=ext),
-                number=number,
-            )
-        )
-    mean = statistics.mean(times)
-    print(
-        f"{name:>32}: count={size:.2f}, mean={mean:.2f}, min={min(times):.2f}, max={max(times):.2f}, "
-        f"avg (stmts/s)={size/mean:.2f}"
-    )
+class TClassIndexed(Base):
+    """TClass with the index on name that the unit test classes have,
+    to separate the index upkeep from the insert itself"""
 
+    __tablename__ = "tclass_indexed"
+    __table_args__ = {"extend_existing": True}
 
-stmt = """
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[int] = mapped_column(index=True, logical_key=True)
+
+
+## The timings are for SQLAlchemy's overhead, not durability, so the SQLite
+## connections skip syncing and keep the journal in memory
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=OFF",
+    "PRAGMA journal_mode=MEMORY",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA locking_mode=EXCLUSIVE",
+)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if type(dbapi_connection).__module__.startswith("sqlite3"):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+db = None
+
+
+def make_db():
+    """Make the in-memory database and its tables, once per process"""
+    global db
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=sa_exc.SAWarning)
+        db = create_db("sqlite:///:memory:")
+        db.drop_all()
+        db.create_all()
+
+
+## The classes and their tables are made once, each trial only empties the table
+setup = """
+dicts = [{"name": i} for i in range(size)]
+id_dicts = [{"id": i, "name": i} for i in range(1, size + 1)]
+objs = [TClass(name=i) for i in range(size)]
+
+with db.Session.begin() as s:
+    s.execute(delete(TClass))
+"""
+
+ADD_ALL = """
 with db.Session() as s:
-    s.add_all([TClass{ext}(name{ext}=i) for i in range(size)])
+    s.add_all(objs)
     s.commit()
 """
-run(stmt, "add_all")
 
-stmt = """
+INSERT_IGNORE_ALL = """
 with db.Session() as s:
-    s.insert_ignore_all([TClass{ext}(name{ext}=i) for i in range(size)])
+    s.insert_ignore_all(objs)
     s.commit()
 """
-run(stmt, "insert_ignore_all")
 
-stmt = """
-with db.Session() as s:
-    for o in [TClass{ext}(name{ext}=i) for i in range(size)]:
+ADD = """
+with db.Session.begin() as s:
+    for o in objs:
         s.add(o)
+"""
+
+INSERT_IGNORE = """
+with db.Session.begin() as s:
+    for o in objs:
+        s.insert_ignore(o)
+"""
+
+## Core executemany inserts, without the unit of work
+CORE_INSERT = """
+with db.Session() as s:
+    s.execute(
+        insert(TClass),
+        dicts,
+        execution_options={"insertmanyvalues_page_size": page_size},
+    )
     s.commit()
 """
-run(stmt, "add")
 
-stmt = """
+CORE_INSERT_DO_NOTHING = """
 with db.Session() as s:
-    for o in [TClass{ext}(name{ext}=i) for i in range(size)]:
-        s.insert_ignore(o)
+    s.execute(
+        sqlite_insert(TClass).on_conflict_do_nothing(),
+        dicts,
+        execution_options={"insertmanyvalues_page_size": page_size},
+    )
     s.commit()
 """
-run(stmt, "insert_ignore")
+
+## Upper bound for insert_ignore with keys, one statement inserting the new
+## rows and returning their keys
+CORE_INSERT_DO_NOTHING_RETURNING = """
+with db.Session() as s:
+    s.execute(
+        sqlite_insert(TClass)
+        .on_conflict_do_nothing(index_elements=["id"])
+        .returning(TClass.id),
+        id_dicts,
+        execution_options={"insertmanyvalues_page_size": page_size},
+    ).all()
+    s.commit()
+"""
+
+## (name, stmt, number, class seen as TClass), statements that insert the
+## objects made in setup, or rows with fixed ids, need number=1, once inserted
+## they aren't inserted again
+BENCHMARKS = (
+    ("add_all", ADD_ALL, 1, TClass),
+    ("add_all indexed", ADD_ALL, 1, TClassIndexed),
+    ("insert_ignore_all", INSERT_IGNORE_ALL, 1, TClass),
+    ("insert_ignore_all indexed", INSERT_IGNORE_ALL, 1, TClassIndexed),
+    ("add", ADD, 1, TClass),
+    ("insert_ignore", INSERT_IGNORE, 1, TClass),
+    ("core insert", CORE_INSERT, None, TClass),
+    ("core insert indexed", CORE_INSERT, None, TClassIndexed),
+    ("core insert do nothing", CORE_INSERT_DO_NOTHING, None, TClass),
+    ("core insert do nothing returning", CORE_INSERT_DO_NOTHING_RETURNING, 1, TClass),
+)
+
+
+def make_timer(stmt, cls, n=size):
+    return timeit.Timer(
+        stmt=stmt, setup=setup, globals={**globals(), "TClass": cls, "size": n}
+    )
+
+
+def warmup(stmt, cls):
+    """Run stmt once on a few rows and discard the time. The first run compiles
+    and caches the statements, which would otherwise land in the first trial
+    """
+    make_timer(stmt, cls, warmup_size).timeit(1)
+
+
+def one_trial(stmt, number, cls_name):
+    """Time one trial, run in the worker processes. The class is passed by name"""
+    cls = globals()[cls_name]
+    warmup(stmt, cls)
+    return make_timer(stmt, cls).timeit(number)
+
+
+def run(stmt, name, number=None, cls=TClass, executor=None):
+    """Time stmt, autorange picks how many times it runs in each of the repeat trials
+    unless number is given. cls is the class the statement sees as TClass.
+    Trials are sent to executor when given
+
+    Returns:
+        dict: name, size, number, repeat and the per statement times of each trial
+    """
+    warmup(stmt, cls)
+    t = make_timer(stmt, cls)
+    if number is None:
+        number, _ = t.autorange()
+    if executor is None:
+        times = t.repeat(repeat=repeat, number=number)
+    else:
+        args = [stmt] * repeat, [number] * repeat, [cls.__name__] * repeat
+        times = list(executor.map(one_trial, *args))
+    times = [x / number for x in times]
+    median = statistics.median(times)
+    q1, _, q3 = statistics.quantiles(times, n=4)
+    print(
+        f"{name:>32}: count={size}, number={number}, median={median:.3f}, iqr={q3 - q1:.3f}, "
+        f"avg (stmts/s)={size/median:.2f}"
+    )
+    return {
+        "name": name,
+        "size": size,
+        "number": number,
+        "repeat": repeat,
+        "times": times,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--parallel", action="store_true", help="run the trials in worker processes"
+    )
+    parser.add_argument(
+        "--output",
+        default="bench_results.jsonl",
+        help="file the raw trial times are appended to as json lines",
+    )
+    args = parser.parse_args()
+
+    make_db()
+    executor = ProcessPoolExecutor(initializer=make_db) if args.parallel else None
+    try:
+        with open(args.output, "a") as f:
+            for name, stmt, number, cls in BENCHMARKS:
+                result = run(stmt, name, number=number, cls=cls, executor=executor)
+                f.write(json.dumps(result) + "\n")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    create_db().drop_db()
 
 
-create_db().drop_db()
+if __name__ == "__main__":
+    main()
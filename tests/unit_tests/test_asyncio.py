@@ -0,0 +1,109 @@
+"""Unit tests for ext/asyncio.py """
+import unittest
+
+from sqlalchemy import String, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from sqlalchemy_extensions.ext.asyncio import (
+    AsyncSessionExtensions,
+    extended_async_sessionmaker,
+)
+from sqlalchemy_extensions.orm import Base
+from sqlalchemy_extensions.orm.session_extension import SessionExtensions
+
+## the async tests need the aiosqlite driver and sqlalchemy[asyncio]'s greenlet
+try:
+    import aiosqlite  # noqa: F401
+    import greenlet  # noqa: F401
+
+    HAS_ASYNC = True
+except ImportError:
+    HAS_ASYNC = False
+
+
+class TClass(Base):
+    __tablename__ = "tclasses_async"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(32), unique=True, logical_key=True)
+    other: Mapped[str] = mapped_column(String(32), default="")
+
+
+class MyAsyncSession(AsyncSession):
+    pass
+
+
+class MySession(Session):
+    pass
+
+
+class TestAsyncSessionmaker(unittest.TestCase):
+    def test_class_mixed_in(self):
+        sm = extended_async_sessionmaker(
+            class_=MyAsyncSession, sync_session_class=MySession
+        )
+        s = sm()
+        self.assertIsInstance(s, AsyncSessionExtensions)
+        self.assertIsInstance(s, MyAsyncSession)
+        self.assertIsInstance(s.sync_session, SessionExtensions)
+        self.assertIsInstance(s.sync_session, MySession)
+
+
+@unittest.skipUnless(HAS_ASYNC, "aiosqlite or greenlet is not installed")
+class TestAsyncSessionExtensions(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[TClass.__table__])
+        self.Session = extended_async_sessionmaker(self.engine)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_inserts(self):
+        async with self.Session() as s:
+            objs = await s.insert_ignore_all([TClass(name="0"), TClass(name="1")])
+            self.assertEqual(len(objs), 2)
+            await s.insert_ignore(TClass(name="2"), flush=True)
+            await s.linsert_ignore_all([TClass(name="2"), TClass(name="3")])
+            await s.linsert_ignore(TClass(name="4"), commit=True)
+            self.assertEqual(await s.count(TClass), 5)
+
+    async def test_updates(self):
+        async with self.Session() as s:
+            await s.linsert_update(TClass(name="0", other="a"), flush=True)
+            await s.linsert_update_all(
+                [TClass(name="0", other="b"), TClass(name="1", other="b")],
+                commit=True,
+            )
+            stmt = select(TClass.name, TClass.other).order_by(TClass.name)
+            rows = (await s.execute(stmt)).all()
+            self.assertEqual(rows, [("0", "b"), ("1", "b")])
+
+    async def test_lookups(self):
+        async with self.Session() as s:
+            await s.linsert_ignore_all([TClass(name=str(i)) for i in range(2)])
+            await s.commit()
+
+            self.assertEqual(await s.find_keys(TClass, "1"), 2)
+            self.assertEqual(
+                await s.find_keys_all(TClass, [("0",), ("2",)]), [(1,), None]
+            )
+            self.assertEqual(await s.lexists(TClass(name="0")), 1)
+            self.assertEqual(
+                await s.lexists_all([TClass(name="1"), TClass(name="2")]), [(2,), None]
+            )
+            self.assertEqual((await s.lget(TClass, "1")).id, 2)
+
+            o, attached = await s.attach_keys(TClass(name="1"))
+            self.assertTrue(attached)
+            self.assertEqual(o.id, 2)
+            os = [TClass(name="0"), TClass(name="2")]
+            self.assertEqual(await s.attach_keys_all(os), [True, False])
+            self.assertEqual([o.id for o in os], [1, None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,19 @@
 """Unit tests for db.py """
+import gc
 import unittest
+import weakref
+from datetime import datetime
+from unittest import mock
 
-from sqlalchemy import String
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column, validates
 
-from sqlalchemy_extensions.orm import Base
+from sqlalchemy_extensions.orm import Base, decl_base
+from sqlalchemy_extensions.orm.decl_base import Registry, declarative_base
+from sqlalchemy_extensions.orm.session_extension import (
+    _prepare_find_keys_stmt,
+    _prepare_key_stmt,
+)
 
 
 class TClass(Base):
@@ -33,11 +42,48 @@ class DClass(Base):
     name2: Mapped[str] = mapped_column(String(128), index=True, logical_key=True)
 
 
+class DateClass(Base):
+    __tablename__ = "dateclasses"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), logical_key=True)
+    created: Mapped[datetime] = mapped_column(DateTime)
+
+
+class VClass(Base):
+    __tablename__ = "vclasses"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), logical_key=True)
+    upper: Mapped[str] = mapped_column(String(128))
+
+    @validates("upper")
+    def validate_upper(self, key, value):
+        return value.upper()
+
+
+class NClass(Base):
+    __tablename__ = "nclasses"
+    __table_args__ = {"extend_existing": True}
+
+    id = Column("id", Integer, primary_key=True)
+    name: Mapped[str] = mapped_column("name", String(128), logical_key=True)
+    other: Mapped[str] = mapped_column(String(128), name="other")
+
+
 class TestDeclarativeBase(unittest.TestCase):
     def test_log_vals(self):
         o = TClass(name="1")
         self.assertEqual(o._log_vals, ("1",))
 
+    def test_log_vals_after_set(self):
+        o = TClass(name="1")
+        self.assertEqual(o._log_vals, ("1",))
+        o.name = "2"
+        self.assertEqual(o._log_vals, ("2",))
+
     def test_key_vals(self):
         o = TClass(id=1)
         self.assertEqual(o._key_vals, (1,))
@@ -50,6 +96,12 @@ class TestDeclarativeBase(unittest.TestCase):
         o = TClass2(id=1, id2=1)
         self.assertEqual(o._key_vals, (1, 1))
 
+    def test_named_columns(self):
+        o = NClass(id=1, name="1", other="2")
+        self.assertEqual(NClass._all_column_names, ("id", "name", "other"))
+        self.assertEqual(o._key_vals, (1,))
+        self.assertEqual(o._log_vals, ("1",))
+
     def test_repr(self):
         o = TClass(name="1")
         self.assertEqual(str(o)[:6], "TClass")
@@ -70,6 +122,62 @@ class TestDeclarativeBase(unittest.TestCase):
         self.assertEqual(js["name"], None)
         self.assertEqual(js["name2"], None)
 
+    def test_from_dicts(self):
+        os = VClass.from_dicts(
+            [{"id": 1, "name": "1", "upper": "a", "extra": 1}, {"name": "2"}]
+        )
+        self.assertEqual([o._key_vals for o in os], [(1,), (None,)])
+        self.assertEqual([o._log_vals for o in os], [("1",), ("2",)])
+        ## validated columns still go through the validator
+        self.assertEqual(os[0].upper, "A")
+        ## values that aren't columns are set with setattr
+        self.assertEqual(os[0].extra, 1)
+        self.assertFalse(hasattr(os[1], "extra"))
+
+    def test_dynamic_classes_collected(self):
+        def make_classes():
+            base = declarative_base()
+
+            class DParent(base):
+                __tablename__ = "dparents"
+
+                id: Mapped[int] = mapped_column(primary_key=True)
+                name: Mapped[str] = mapped_column(String(128), logical_key=True)
+
+            class DChild(base):
+                __tablename__ = "dchildren"
+
+                id: Mapped[int] = mapped_column(primary_key=True)
+                parent_id: Mapped[int] = mapped_column(ForeignKey(DParent.id))
+
+            rels = Registry.get_relationships("dparents", DChild)
+            self.assertEqual(
+                [(r.start_col, r.end_col) for r in rels], [("id", "parent_id")]
+            )
+            ## the cached statements are reused
+            stmt = _prepare_find_keys_stmt(DParent)
+            self.assertIs(_prepare_find_keys_stmt(DParent), stmt)
+            stmt = _prepare_key_stmt(DParent, DParent._log_columns)
+            self.assertIs(_prepare_key_stmt(DParent, DParent._log_columns), stmt)
+            return weakref.ref(DParent), weakref.ref(DChild)
+
+        parent_ref, child_ref = make_classes()
+        gc.collect()
+        self.assertIsNone(parent_ref())
+        self.assertIsNone(child_ref())
+
+    def test_to_json_bytes_json(self):
+        o = DateClass(id=1, name="é", created=datetime(2024, 1, 2, 3, 4, 5))
+        expected = '{"id":1,"name":"é","created":"2024-01-02T03:04:05"}'.encode()
+        with mock.patch.object(decl_base, "orjson", None):
+            self.assertEqual(o.to_json_bytes(), expected)
+
+    @unittest.skipIf(decl_base.orjson is None, "orjson is not installed")
+    def test_to_json_bytes_orjson(self):
+        o = DateClass(id=1, name="é", created=datetime(2024, 1, 2, 3, 4, 5))
+        expected = '{"id":1,"name":"é","created":"2024-01-02T03:04:05"}'.encode()
+        self.assertEqual(o.to_json_bytes(), expected)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,9 +1,10 @@
 """Unit tests for db.py """
 import unittest
-from typing import List
+from typing import List, Optional
 
-from sqlalchemy import ForeignKey, String, select
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import ForeignKey, String, event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Mapped, load_only, mapped_column, relationship
 from sqlgold import DB
 from sqlgold.utils.test_db_utils import create_test_db, set_test_config
 
@@ -24,6 +25,58 @@ class TClass(Base):
     name: Mapped[str] = mapped_column(String(128), index=True)
 
 
+class TClassDefault(Base):
+    __tablename__ = "tclass_default"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), index=True)
+    other: Mapped[str] = mapped_column(String(128), default="default")
+
+
+class TClassListener(Base):
+    __tablename__ = "tclass_listener"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), index=True)
+    other: Mapped[Optional[str]] = mapped_column(String(128))
+
+
+@event.listens_for(TClassListener, "before_insert")
+def set_other(mapper, connection, target):
+    target.other = "listener"
+
+
+class TClassNamed(Base):
+    __tablename__ = "tclass_named"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    nm: Mapped[str] = mapped_column("name", String(128), index=True)
+
+
+class TEmployee(Base):
+    __tablename__ = "temployee"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), index=True)
+    kind: Mapped[str] = mapped_column(String(32))
+
+    __mapper_args__ = {"polymorphic_on": "kind", "polymorphic_identity": "employee"}
+
+
+class TEngineer(TEmployee):
+    __tablename__ = "tengineer"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(ForeignKey("temployee.id"), primary_key=True)
+    language: Mapped[Optional[str]] = mapped_column(String(128))
+
+    __mapper_args__ = {"polymorphic_identity": "engineer"}
+
+
 class TParent(Base):
     __tablename__ = "tparent"
     __table_args__ = {"extend_existing": True}
@@ -49,12 +102,11 @@ class SingleTest(unittest.TestCase):
     def test_basic_insert_ignore_all(self):
         with create_test_db() as db:
             size = 2
-            sources = {str(x): TClass(name=str(x)) for x in range(1, size + 1)}
+            inserted_objs = [TClass(name=str(x)) for x in range(1, size + 1)]
             with db.Session() as s:
-                inserted_objs = list(sources.values())
                 s.insert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TClass)))
+                dbobjs = list(s.scalars(select(TClass).options(load_only(TClass.id))))
                 self.assertEqual(len(dbobjs), size)
                 # check id in session
                 for o in inserted_objs:
@@ -63,16 +115,96 @@ class SingleTest(unittest.TestCase):
             for o in inserted_objs:
                 self.assertIsNotNone(o.id)
 
+    def test_insert_ignore_all_generator(self):
+        with create_test_db() as db:
+            size = 3
+            with db.Session() as s:
+                objs = s.insert_ignore_all(
+                    (TClass(id=x, name=str(x)) for x in range(1, size + 1)),
+                    commit=True,
+                )
+                self.assertEqual(len(objs), size)
+                self.assertEqual(s.count(TClass), size)
+
+    def test_insert_ignore_all_commit_refresh(self):
+        with create_test_db() as db:
+            size = 20
+            objs = [TClass(name=str(x)) for x in range(size)]
+            with db.Session() as s:
+                statements = []
+
+                def record(conn, cursor, statement, params, context, executemany):
+                    statements.append(statement)
+
+                engine = s.get_bind()
+                event.listen(engine, "after_cursor_execute", record)
+                try:
+                    s.insert_ignore_all(objs, commit=True, refresh=True)
+                finally:
+                    event.remove(engine, "after_cursor_execute", record)
+                ## the insert and one select for the refresh, the expired
+                ## objects aren't loaded one by one for their keys
+                selects = [st for st in statements if st.startswith("SELECT")]
+                self.assertEqual(len(selects), 1, statements)
+                self.assertEqual([o.name for o in objs], [str(x) for x in range(size)])
+
+    def test_insert_ignore_all_defaults(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                objs = [
+                    TClassDefault(name="1"),
+                    TClassDefault(name="2", other="2"),
+                    TClassDefault(name="3"),
+                ]
+                s.insert_ignore_all(objs, commit=True)
+
+                self.assertEqual(s.count(TClassDefault), len(objs))
+                for o in objs:
+                    self.assertIsNotNone(o.id)
+                    dbo = s.get(TClassDefault, o.id)
+                    self.assertEqual(dbo.name, o.name)
+                self.assertEqual(s.get(TClassDefault, objs[0].id).other, "default")
+                self.assertEqual(s.get(TClassDefault, objs[1].id).other, "2")
+
+    def test_insert_ignore_all_listener(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                s.add(TClassListener(id=1, name="1"))
+                s.flush()
+                objs = [TClassListener(id=x, name=str(x)) for x in range(1, 4)]
+                s.insert_ignore_all(objs, flush=True)
+
+                self.assertEqual(s.count(TClassListener), 3)
+                stmt = select(TClassListener.other).order_by(TClassListener.id)
+                self.assertEqual(s.scalars(stmt).all(), ["listener"] * 3)
+
+    def test_insert_ignore_all_named_column(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                objs = [TClassNamed(id=x, nm=str(x)) for x in range(1, 3)]
+                s.insert_ignore_all(objs, flush=True)
+
+                stmt = select(TClassNamed.nm).order_by(TClassNamed.id)
+                self.assertEqual(s.scalars(stmt).all(), ["1", "2"])
+
+    def test_insert_ignore_all_joined_inheritance(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                objs = [TEngineer(id=x, name=str(x)) for x in range(1, 4)]
+                s.insert_ignore_all(objs, flush=True)
+
+                self.assertEqual(s.count(TEmployee), 3)
+                self.assertEqual(s.count(TEngineer), 3)
+
     def test_basic_insert_ignore_duplicates(self):
         with create_test_db() as db:
             size = 3
             dup_size = 2
-            sources = {str(x): TClass(id=x, name=str(x)) for x in range(1, size + 1)}
+            inserted_objs = [TClass(id=x, name=str(x)) for x in range(1, size + 1)]
             with db.Session() as s:
-                inserted_objs = sources.values()
                 s.insert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TClass)))
+                dbobjs = list(s.scalars(select(TClass).options(load_only(TClass.id))))
                 self.assertEqual(len(dbobjs), size)
                 # check id in session
                 for o in inserted_objs:
@@ -81,15 +213,11 @@ class SingleTest(unittest.TestCase):
             for o in inserted_objs:
                 self.assertIsNotNone(o.id)
 
-            sources2 = {
-                str(x): TClass(id=x, name=str(x)) for x in range(1, dup_size + 1)
-            }
+            inserted_objs2 = [TClass(id=x, name=str(x)) for x in range(1, dup_size + 1)]
             with db.Session() as s:
-                inserted_objs2 = list(sources2.values())
                 s.insert_ignore_all(inserted_objs2, commit=True)
-                dbobjs2 = list(s.scalars(select(TClass)))
                 mx = max(size, dup_size)
-                self.assertEqual(len(dbobjs2), mx)
+                self.assertEqual(s.count(TClass), mx)
 
                 # check id in session
                 for o in inserted_objs2:
@@ -102,19 +230,19 @@ class SingleTest(unittest.TestCase):
         with create_test_db() as db:
             size = 10
             dup_size = 15
-            sources = {str(x): TClass(id=x, name=str(x)) for x in range(1, size + 1)}
+            sources = [TClass(id=x, name=str(x)) for x in range(1, size + 1)]
 
             with db.Session() as s:
-                s.insert_ignore_all(sources.values(), commit=True)
+                s.insert_ignore_all(sources, commit=True)
 
                 ## Insert a mix of classes we've made and not
-                dup_sources = {
-                    str(x): TClass(id=x, name=str(x)) for x in range(1, dup_size + 1)
-                }
+                dup_sources = [
+                    TClass(id=x, name=str(x)) for x in range(1, dup_size + 1)
+                ]
 
                 # Make sure something was created
-                mix = s.insert_ignore_all(dup_sources.values(), commit=True)
-                stmt = select(TClass)
+                mix = s.insert_ignore_all(dup_sources, commit=True)
+                stmt = select(TClass).options(load_only(TClass.id))
                 self.assertEqual(len(list(s.scalars(stmt))), dup_size)
                 for m in mix:
                     self.assertIsNotNone(m.id)
@@ -128,110 +256,143 @@ class SingleTest(unittest.TestCase):
 
             with db.Session() as s:
                 s.insert_ignore_all(sources.values(), commit=True)
-                stmt = select(TParent)
+                stmt = select(TParent).options(load_only(TParent.id))
                 self.assertEqual(len(list(s.scalars(stmt))), size)
-            children = {
-                str(x): TChild(
-                    id=child_start_id + x, name=str(x), parent=sources[str(x)]
-                )
+            children = [
+                TChild(id=child_start_id + x, name=str(x), parent=sources[str(x)])
                 for x in range(1, nchildren + 1)
-            }
+            ]
 
             with db.Session() as s:
-                s.insert_ignore_all(children.values(), commit=True)
-                stmt = select(TChild)
-                self.assertEqual(len(list(s.scalars(stmt))), nchildren)
-                stmt = select(TParent)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
+                s.insert_ignore_all(children, commit=True)
+                self.assertEqual(s.count(TChild), nchildren)
+                self.assertEqual(s.count(TParent), size)
 
     def test_parent_child_id(self):
         with create_test_db() as db:
             size = 2
             nchildren = 3
             child_start_id = size * nchildren
-            sources = {str(x): TParent(id=x, name=str(x)) for x in range(1, size + 1)}
-            for s in sources.values():
-                children = {
-                    str(x): TChild(id=s.id * nchildren + x, name=str(x), parent_id=s.id)
+            sources = [TParent(id=x, name=str(x)) for x in range(1, size + 1)]
+            for s in sources:
+                children = [
+                    TChild(id=s.id * nchildren + x, name=str(x), parent_id=s.id)
                     for x in range(1, nchildren + 1)
-                }
-                s.children = list(children.values())
+                ]
+                s.children = children
 
             with db.Session(expire_on_commit=False) as s:
-                s.insert_ignore_all(sources.values(), commit=True)
-                stmt = select(TParent)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
-                stmt = select(TChild)
-                self.assertEqual(len(list(s.scalars(stmt))), size * nchildren)
+                s.insert_ignore_all(sources, commit=True)
+                self.assertEqual(s.count(TParent), size)
+                self.assertEqual(s.count(TChild), size * nchildren)
 
             with db.Session() as s:
-                s.insert_ignore_all(sources.values(), commit=True)
-                stmt = select(TParent)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
-                stmt = select(TChild)
-                self.assertEqual(len(list(s.scalars(stmt))), size * nchildren)
+                s.insert_ignore_all(sources, commit=True)
+                self.assertEqual(s.count(TParent), size)
+                self.assertEqual(s.count(TChild), size * nchildren)
 
     def test_multiple_object_insert_ignore_dups(self):
         with create_test_db() as db:
             size = 10
             dup_size = 5
-            sources = {str(x): TClass(id=x, name=str(x)) for x in range(1, size + 1)}
+            sources = [TClass(id=x, name=str(x)) for x in range(1, size + 1)]
 
             with db.Session() as s:
-                s.insert_ignore_all(sources.values(), commit=True)
+                s.insert_ignore_all(sources, commit=True)
 
                 ## Insert the duplicates
-                dup_sources = {
-                    str(x): TClass(id=x, name=str(x)) for x in range(1, dup_size + 1)
-                }
+                dup_sources = [
+                    TClass(id=x, name=str(x)) for x in range(1, dup_size + 1)
+                ]
 
                 # Make sure nothing was created
-                s.insert_ignore_all(dup_sources.values(), commit=True)
-                stmt = select(TClass)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
+                s.insert_ignore_all(dup_sources, commit=True)
+                self.assertEqual(s.count(TClass), size)
 
     def test_multiple_object_insert_ignore_mix(self):
         with create_test_db() as db:
             size = 10
             dup_size = 15
-            sources = {str(x): TClass(id=x, name=str(x)) for x in range(1, size + 1)}
+            sources = [TClass(id=x, name=str(x)) for x in range(1, size + 1)]
 
             with db.Session() as s:
-                s.insert_ignore_all(sources.values(), commit=True)
+                s.insert_ignore_all(sources, commit=True)
 
                 ## Insert a mix of classes we've made and not
-                dup_sources = {
-                    str(x): TClass(id=x, name=str(x)) for x in range(1, dup_size + 1)
-                }
+                dup_sources = [
+                    TClass(id=x, name=str(x)) for x in range(1, dup_size + 1)
+                ]
 
                 # Make sure something was created
-                s.insert_ignore_all(dup_sources.values(), commit=True)
-                stmt = select(TClass)
-                self.assertEqual(len(list(s.scalars(stmt))), dup_size)
+                s.insert_ignore_all(dup_sources, commit=True)
+                self.assertEqual(s.count(TClass), dup_size)
 
     def test_single_object_insert_ignore_no_dups(self):
         with create_test_db() as db:
             size = 10
-            sources = {str(x): TClass(id=x, name=str(x)) for x in range(1, size + 1)}
+            sources = [TClass(id=x, name=str(x)) for x in range(1, size + 1)]
 
             with db.Session() as s:
-                s.add_all(sources.values())
+                s.add_all(sources)
                 s.commit()
 
                 not_dup_idx = 1
                 no_dup_s = TClass(id=not_dup_idx, name=str(not_dup_idx))
                 s.insert_ignore(no_dup_s, commit=True)
                 ## Make sure something was created
-                stmt = select(TClass).where(TClass.name == str(not_dup_idx))
-                self.assertEqual(len(list(s.scalars(stmt))), 1)
+                stmt = (
+                    select(func.count())
+                    .select_from(TClass)
+                    .where(TClass.name == str(not_dup_idx))
+                )
+                self.assertEqual(s.scalar(stmt), 1)
+
+    def test_single_object_insert_ignore_new(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                with_id = s.insert_ignore(TClass(id=5, name="5"), commit=True)
+                without_id = s.insert_ignore(TClass(name="6"), commit=True)
+
+                self.assertEqual(s.count(TClass), 2)
+                self.assertEqual(with_id.id, 5)
+                self.assertIsNotNone(without_id.id)
+
+    def test_single_object_insert_ignore_optimistic(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                s.add(TClass(id=1, name="1"))
+                s.commit()
+                s.expunge_all()
+
+                dup = s.insert_ignore(TClass(id=1, name="dup"), optimistic=True)
+                self.assertEqual(dup.name, "1")
+                new = s.insert_ignore(TClass(id=2, name="2"), optimistic=True)
+                s.commit()
+                self.assertEqual(new.id, 2)
+                self.assertEqual(s.count(TClass), 2)
+
+    def test_single_object_insert_ignore_optimistic_error(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                ## a NOT NULL violation isn't a duplicate, it is raised
+                with self.assertRaises(IntegrityError):
+                    s.insert_ignore(TClass(id=1, name=None), optimistic=True)
+                s.rollback()
+
+                ## a pending object's error is raised before the SAVEPOINT
+                s.add(TClass(id=2, name=None))
+                with self.assertRaises(IntegrityError):
+                    s.insert_ignore(TClass(id=1, name="1"), optimistic=True)
+                s.rollback()
+                self.assertEqual(s.count(TClass), 0)
 
     def test_single_object_insert_ignore_dups(self):
         with create_test_db() as db:
             size = 10
-            sources = {str(x): TClass(id=x, name=str(x)) for x in range(1, size + 1)}
+            sources = [TClass(id=x, name=str(x)) for x in range(1, size + 1)]
 
             with db.Session() as s:
-                s.add_all(sources.values())
+                s.add_all(sources)
                 s.commit()
 
                 ## Check upserts
@@ -240,8 +401,12 @@ class SingleTest(unittest.TestCase):
                 s.insert_ignore(dup_s, commit=True)
 
                 ## Make sure nothing new was created
-                stmt = select(TClass).where(TClass.name == str(test_idx))
-                self.assertEqual(len(list(s.scalars(stmt))), 1)
+                stmt = (
+                    select(func.count())
+                    .select_from(TClass)
+                    .where(TClass.name == str(test_idx))
+                )
+                self.assertEqual(s.scalar(stmt), 1)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,10 @@
 """Unit tests for db.py """
 import unittest
-from typing import List
+from datetime import datetime, timezone
+from typing import List, Optional
 
-from sqlalchemy import ForeignKey, String, select
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import DateTime, ForeignKey, String, event, func, select
+from sqlalchemy.orm import Mapped, load_only, mapped_column, relationship
 from sqlgold import DB
 from sqlgold.utils.test_db_utils import create_test_db, set_test_config
 
@@ -24,6 +25,80 @@ class TClass(Base):
     name: Mapped[str] = mapped_column(String(128), index=True, logical_key=True)
 
 
+class TClassUnique(Base):
+    __tablename__ = "tclass_unique"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), unique=True, logical_key=True)
+
+
+class TClassListener(Base):
+    __tablename__ = "tclass_listener"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), index=True, logical_key=True)
+    other: Mapped[Optional[str]] = mapped_column(String(128))
+
+
+@event.listens_for(TClassListener, "before_insert")
+def set_other(mapper, connection, target):
+    target.other = "listener"
+
+
+class TClassUniqueListener(Base):
+    __tablename__ = "tclass_unique_listener"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), unique=True, logical_key=True)
+    other: Mapped[Optional[str]] = mapped_column(String(128))
+
+
+@event.listens_for(TClassUniqueListener, "before_insert")
+def set_unique_other(mapper, connection, target):
+    target.other = "listener"
+
+
+class TClassTZ(Base):
+    __tablename__ = "tclass_tz"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    at: Mapped[datetime] = mapped_column(DateTime(timezone=True), logical_key=True)
+
+
+class TClassUniqueTZ(Base):
+    __tablename__ = "tclass_unique_tz"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), unique=True, logical_key=True
+    )
+
+
+class TEmployee(Base):
+    __tablename__ = "temployee"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32))
+
+    __mapper_args__ = {"polymorphic_on": "kind", "polymorphic_identity": "employee"}
+
+
+class TEngineer(TEmployee):
+    __tablename__ = "tengineer"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(ForeignKey("temployee.id"), primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), unique=True, logical_key=True)
+
+    __mapper_args__ = {"polymorphic_identity": "engineer"}
+
+
 class TParent(Base):
     __tablename__ = "tparent"
     __table_args__ = {"extend_existing": True}
@@ -49,12 +124,11 @@ class SingleTest(unittest.TestCase):
     def test_basic_linsert_ignore_all(self):
         with create_test_db() as db:
             size = 2
-            sources = {str(x): TClass(name=str(x)) for x in range(size)}
+            inserted_objs = [TClass(name=str(x)) for x in range(size)]
             with db.Session() as s:
-                inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TClass)))
+                dbobjs = list(s.scalars(select(TClass).options(load_only(TClass.id))))
                 self.assertEqual(len(dbobjs), size)
                 # check id in session
                 for o in inserted_objs:
@@ -63,16 +137,108 @@ class SingleTest(unittest.TestCase):
             for o in inserted_objs:
                 self.assertIsNotNone(o.id)
 
+    def test_linsert_ignore_all_generator(self):
+        with create_test_db() as db:
+            size = 3
+            with db.Session() as s:
+                objs = s.linsert_ignore_all(
+                    (TClass(name=str(x)) for x in range(size)), commit=True
+                )
+                self.assertEqual(len(objs), size)
+                self.assertEqual(s.count(TClass), size)
+                for o in objs:
+                    self.assertIsNotNone(o.id)
+
+    def test_linsert_ignore_all_unique_mix(self):
+        with create_test_db() as db:
+            size = 4
+            dup_size = 6
+            with db.Session() as s:
+                objs = [TClassUnique(name=str(x)) for x in range(size)]
+                s.linsert_ignore_all(objs, commit=True)
+                ids = {o.name: o.id for o in objs}
+
+                mix = [TClassUnique(name=str(x)) for x in range(dup_size)]
+                s.linsert_ignore_all(mix, commit=True)
+                self.assertEqual(s.count(TClassUnique), dup_size)
+                for o in mix:
+                    self.assertIsNotNone(o.id)
+                    if o.name in ids:
+                        self.assertEqual(o.id, ids[o.name])
+
+    def test_linsert_ignore_all_repeated_in_batch(self):
+        with create_test_db() as db:
+            names = ["0", "1", "0", "1", "1"]
+            with db.Session() as s:
+                objs = [TClass(name=name) for name in names]
+                s.linsert_ignore_all(objs, commit=True)
+
+                self.assertEqual(s.count(TClass), len(set(names)))
+                self.assertEqual(objs[0].id, objs[2].id)
+                self.assertEqual(objs[1].id, objs[3].id)
+                self.assertEqual(objs[1].id, objs[4].id)
+
+    def test_linsert_ignore_all_listener(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                s.add(TClassListener(name="0"))
+                s.flush()
+                objs = [TClassListener(name=str(x)) for x in range(3)]
+                s.linsert_ignore_all(objs, flush=True)
+
+                self.assertEqual(s.count(TClassListener), 3)
+                stmt = select(TClassListener.other).order_by(TClassListener.id)
+                self.assertEqual(s.scalars(stmt).all(), ["listener"] * 3)
+
+    def test_linsert_ignore_all_unique_listener(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                s.add(TClassUniqueListener(name="0"))
+                s.flush()
+                objs = [TClassUniqueListener(name=str(x)) for x in range(3)]
+                s.linsert_ignore_all(objs, flush=True)
+
+                self.assertEqual(s.count(TClassUniqueListener), 3)
+                stmt = select(TClassUniqueListener.other).order_by(
+                    TClassUniqueListener.id
+                )
+                self.assertEqual(s.scalars(stmt).all(), ["listener"] * 3)
+
+    def test_linsert_ignore_all_joined_inheritance(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                objs = [TEngineer(name=str(x)) for x in range(3)]
+                s.linsert_ignore_all(objs, flush=True)
+
+                self.assertEqual(s.count(TEmployee), 3)
+                self.assertEqual(s.count(TEngineer), 3)
+                self.assertEqual([o.kind for o in objs], ["engineer"] * 3)
+
+    def test_linsert_ignore_all_tz_datetime(self):
+        ## SQLite reads the datetimes back naive, they must still match
+        for cls in (TClassTZ, TClassUniqueTZ):
+            with self.subTest(cls=cls), create_test_db() as db:
+                ats = [datetime(2020, 1, x, tzinfo=timezone.utc) for x in (1, 2)]
+                with db.Session() as s:
+                    objs = [cls(at=at) for at in ats[:1]]
+                    s.linsert_ignore_all(objs, flush=True)
+                    self.assertEqual([o.id for o in objs], [1])
+
+                    objs = [cls(at=at) for at in ats]
+                    s.linsert_ignore_all(objs, flush=True)
+                    self.assertEqual([o.id for o in objs], [1, 2])
+                    self.assertEqual(s.count(cls), 2)
+                    self.assertEqual(s.find_keys_all(cls, [(ats[1],)]), [(2,)])
+
     def test_basic_linsert_ignore_duplicates(self):
         with create_test_db() as db:
             size = 2
             dup_size = 2
-            sources = {str(x): TClass(name=str(x)) for x in range(size)}
+            inserted_objs = [TClass(name=str(x)) for x in range(size)]
             with db.Session() as s:
-                inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TClass)))
+                dbobjs = list(s.scalars(select(TClass).options(load_only(TClass.id))))
                 self.assertEqual(len(dbobjs), size)
                 # check id in session
                 for o in inserted_objs:
@@ -81,12 +247,10 @@ class SingleTest(unittest.TestCase):
             for o in inserted_objs:
                 self.assertIsNotNone(o.id)
 
-            sources2 = {str(x): TClass(name=str(x)) for x in range(dup_size)}
+            inserted_objs2 = [TClass(name=str(x)) for x in range(dup_size)]
             with db.Session() as s:
-                inserted_objs2 = list(sources2.values())
                 s.linsert_ignore_all(inserted_objs2, commit=True)
-                dbobjs2 = list(s.scalars(select(TClass)))
-                self.assertEqual(len(dbobjs2), size)
+                self.assertEqual(s.count(TClass), size)
 
                 # check id in session
                 for o in inserted_objs2:
@@ -99,17 +263,17 @@ class SingleTest(unittest.TestCase):
         with create_test_db() as db:
             size = 10
             dup_size = 15
-            sources = {str(x): TClass(name=str(x)) for x in range(size)}
+            sources = [TClass(name=str(x)) for x in range(size)]
 
             with db.Session() as s:
-                s.linsert_ignore_all(sources.values(), commit=True)
+                s.linsert_ignore_all(sources, commit=True)
 
                 ## Insert a mix of classes we've made and not
-                dup_sources = {str(x): TClass(name=str(x)) for x in range(dup_size)}
+                dup_sources = [TClass(name=str(x)) for x in range(dup_size)]
 
                 # Make sure something was created
-                mix = s.linsert_ignore_all(dup_sources.values(), commit=True)
-                stmt = select(TClass)
+                mix = s.linsert_ignore_all(dup_sources, commit=True)
+                stmt = select(TClass).options(load_only(TClass.id))
                 self.assertEqual(len(list(s.scalars(stmt))), dup_size)
                 for m in mix:
                     self.assertIsNotNone(m.id)
@@ -121,18 +285,16 @@ class SingleTest(unittest.TestCase):
 
             with db.Session() as s:
                 s.linsert_ignore_all(sources.values(), commit=True)
-                stmt = select(TParent)
+                stmt = select(TParent).options(load_only(TParent.id))
                 self.assertEqual(len(list(s.scalars(stmt))), size)
-            children = {
-                str(x): TChild(name=str(x), parent=sources[str(x)]) for x in range(size)
-            }
+            children = [
+                TChild(name=str(x), parent=sources[str(x)]) for x in range(size)
+            ]
 
             with db.Session() as s:
-                s.linsert_ignore_all(children.values(), commit=True)
-                stmt = select(TChild)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
-                stmt = select(TParent)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
+                s.linsert_ignore_all(children, commit=True)
+                self.assertEqual(s.count(TChild), size)
+                self.assertEqual(s.count(TParent), size)
 
     def test_parent_child_id(self):
         with create_test_db() as db:
@@ -141,77 +303,76 @@ class SingleTest(unittest.TestCase):
 
             with db.Session() as s:
                 s.linsert_ignore_all(sources.values(), commit=True)
-                stmt = select(TParent)
+                stmt = select(TParent).options(load_only(TParent.id))
                 self.assertEqual(len(list(s.scalars(stmt))), size)
-            children = {
-                str(x): TChild(name=str(x), parent_id=sources[str(x)].id)
-                for x in range(size)
-            }
+            children = [
+                TChild(name=str(x), parent_id=sources[str(x)].id) for x in range(size)
+            ]
 
             with db.Session() as s:
-                s.linsert_ignore_all(children.values(), commit=True)
-                stmt = select(TChild)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
-                stmt = select(TParent)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
+                s.linsert_ignore_all(children, commit=True)
+                self.assertEqual(s.count(TChild), size)
+                self.assertEqual(s.count(TParent), size)
 
     def test_multiple_object_linsert_ignore_dups(self):
         with create_test_db() as db:
             size = 10
             dup_size = 5
-            sources = {str(x): TClass(name=str(x)) for x in range(size)}
+            sources = [TClass(name=str(x)) for x in range(size)]
 
             with db.Session() as s:
-                s.linsert_ignore_all(sources.values(), commit=True)
+                s.linsert_ignore_all(sources, commit=True)
 
                 ## Insert the duplicates
-                dup_sources = {str(x): TClass(name=str(x)) for x in range(dup_size)}
+                dup_sources = [TClass(name=str(x)) for x in range(dup_size)]
 
                 # Make sure nothing was created
-                s.linsert_ignore_all(dup_sources.values(), commit=True)
-                stmt = select(TClass)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
+                s.linsert_ignore_all(dup_sources, commit=True)
+                self.assertEqual(s.count(TClass), size)
 
     def test_multiple_object_linsert_ignore_mix(self):
         with create_test_db() as db:
             size = 10
             dup_size = 15
-            sources = {str(x): TClass(name=str(x)) for x in range(size)}
+            sources = [TClass(name=str(x)) for x in range(size)]
 
             with db.Session() as s:
-                s.linsert_ignore_all(sources.values(), commit=True)
+                s.linsert_ignore_all(sources, commit=True)
 
                 ## Insert a mix of classes we've made and not
-                dup_sources = {str(x): TClass(name=str(x)) for x in range(dup_size)}
+                dup_sources = [TClass(name=str(x)) for x in range(dup_size)]
 
                 # Make sure something was created
-                s.linsert_ignore_all(dup_sources.values(), commit=True)
-                stmt = select(TClass)
-                self.assertEqual(len(list(s.scalars(stmt))), dup_size)
+                s.linsert_ignore_all(dup_sources, commit=True)
+                self.assertEqual(s.count(TClass), dup_size)
 
     def test_single_object_linsert_ignore_no_dups(self):
         with create_test_db() as db:
             size = 10
-            sources = {str(x): TClass(name=str(x)) for x in range(size)}
+            sources = [TClass(name=str(x)) for x in range(size)]
 
             with db.Session() as s:
-                s.add_all(sources.values())
+                s.add_all(sources)
                 s.commit()
 
                 test_name = str(size)
                 no_dup_s = TClass(name=test_name)
                 s.linsert_ignore(no_dup_s, commit=True)
                 ## Make sure nothing was created
-                stmt = select(TClass).where(TClass.name == test_name)
-                self.assertEqual(len(list(s.scalars(stmt))), 1)
+                stmt = (
+                    select(func.count())
+                    .select_from(TClass)
+                    .where(TClass.name == test_name)
+                )
+                self.assertEqual(s.scalar(stmt), 1)
 
     def test_single_object_linsert_ignore_dups(self):
         with create_test_db() as db:
             size = 10
-            sources = {str(x): TClass(name=str(x)) for x in range(size)}
+            sources = [TClass(name=str(x)) for x in range(size)]
 
             with db.Session() as s:
-                s.add_all(sources.values())
+                s.add_all(sources)
                 s.commit()
 
                 ## Check upserts
@@ -220,16 +381,20 @@ class SingleTest(unittest.TestCase):
                 s.linsert_ignore(dup_s, commit=True)
 
                 ## Make sure nothing new was created
-                stmt = select(TClass).where(TClass.name == test_name)
-                self.assertEqual(len(list(s.scalars(stmt))), 1)
+                stmt = (
+                    select(func.count())
+                    .select_from(TClass)
+                    .where(TClass.name == test_name)
+                )
+                self.assertEqual(s.scalar(stmt), 1)
 
     def test_single_object_linsert_ignore_lexists_id(self):
         with create_test_db() as db:
             size = 10
-            sources = {str(x): TClass(name=str(x)) for x in range(size)}
+            sources = [TClass(name=str(x)) for x in range(size)]
 
             with db.Session.begin() as s:
-                s.add_all(sources.values())
+                s.add_all(sources)
 
             test_name = "1"
             with db.Session() as s:
@@ -251,10 +416,10 @@ class SingleTest(unittest.TestCase):
     def test_single_object_linsert_ignore_not_lexists_id(self):
         with create_test_db() as db:
             size = 10
-            sources = {str(x): TClass(name=str(x)) for x in range(size)}
+            sources = [TClass(name=str(x)) for x in range(size)]
 
             with db.Session.begin() as s:
-                s.add_all(sources.values())
+                s.add_all(sources)
 
             test_name = str(size)
 
@@ -1,19 +1,42 @@
 """Unit tests for db.py """
+import os
 import unittest
-
-from sqlalchemy import String
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import (
+    ARRAY,
+    Column,
+    DateTime,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    event,
+    insert,
+    select,
+)
+from sqlalchemy.engine.default import CACHE_HIT
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlgold import DB
 from sqlgold.utils.test_db_utils import create_test_db, set_test_config
 
 from sqlalchemy_extensions import sessionmaker
 from sqlalchemy_extensions.orm import Base
+from sqlalchemy_extensions.orm.session_extension import (
+    _copy_columns_supported,
+    _copy_text_value,
+)
 
 set_test_config("sqlalchemy-extensions")
 
 DB.default_base = Base
 DB.default_sessionmaker = sessionmaker
 
+## Rows for the scaled tests, they only run when SE_PERF_SIZE is set
+PERF_SIZE = int(os.environ.get("SE_PERF_SIZE", "0"))
+
 
 class TClass(Base):
     __tablename__ = "tclasses"
@@ -32,6 +55,46 @@ class TClassOther(Base):
     other: Mapped[str] = mapped_column(String(32))
 
 
+class TClassOtherUnique(Base):
+    __tablename__ = "tclasses_with_other_unique"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(32), unique=True, logical_key=True)
+    other: Mapped[str] = mapped_column(String(32))
+
+
+class TClassOtherUniqueListener(Base):
+    __tablename__ = "tclasses_with_other_unique_listener"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(32), unique=True, logical_key=True)
+    other: Mapped[str] = mapped_column(String(32))
+    stamp: Mapped[Optional[str]] = mapped_column(String(32))
+
+
+@event.listens_for(TClassOtherUniqueListener, "before_insert")
+def stamp_insert(mapper, connection, target):
+    target.stamp = "insert"
+
+
+@event.listens_for(TClassOtherUniqueListener, "before_update")
+def stamp_update(mapper, connection, target):
+    target.stamp = "update"
+
+
+class TClassUniqueTZ(Base):
+    __tablename__ = "tclasses_unique_tz"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), unique=True, logical_key=True
+    )
+    other: Mapped[str] = mapped_column(String(32))
+
+
 class TClass2(Base):
     __tablename__ = "tclasses_multi_id"
     __table_args__ = {"extend_existing": True}
@@ -56,7 +119,7 @@ class TestDBFuncs(unittest.TestCase):
             with db.Session() as s:
                 o = TClassOther(name="1", other="1")
                 s.add(o)
-                s.commit()
+                s.flush()
                 o = TClassOther(name="2", other="2")
                 s.linsert_update(o)
                 s.commit()
@@ -69,7 +132,7 @@ class TestDBFuncs(unittest.TestCase):
             with db.Session() as s:
                 o = TClassOther(name="1", other="1")
                 s.add(o)
-                s.commit()
+                s.flush()
                 o2 = TClassOther(name="1", other="2")
                 s.linsert_update(o2)
                 dbo = s.get(TClassOther, 1)
@@ -83,7 +146,7 @@ class TestDBFuncs(unittest.TestCase):
             with db.Session() as s:
                 os = [TClassOther(name=str(i), other=str(i)) for i in range(size)]
                 s.add_all(os)
-                s.commit()
+                s.flush()
                 os2 = [
                     TClassOther(name=str(i), other=str(i))
                     for i in range(size, size + size)
@@ -99,7 +162,7 @@ class TestDBFuncs(unittest.TestCase):
             with db.Session() as s:
                 os = [TClassOther(name=str(i), other=str(i)) for i in range(size)]
                 s.add_all(os)
-                s.commit()
+                s.flush()
                 os2 = [
                     TClassOther(name=str(i), other=str(i + size)) for i in range(size)
                 ]
@@ -118,7 +181,7 @@ class TestDBFuncs(unittest.TestCase):
             with db.Session() as s:
                 os = [TClassOther(name=str(i), other=str(i)) for i in range(size)]
                 s.add_all(os)
-                s.commit()
+                s.flush()
                 os2 = [
                     TClassOther(name=str(i), other=str(i + size))
                     for i in range(1, size + 1)
@@ -126,7 +189,7 @@ class TestDBFuncs(unittest.TestCase):
                 s.linsert_update_all(os2)
                 count = s.count(TClassOther)
                 self.assertEqual(count, size + 1)
-                dbos = [s.get(TClassOther, i + 1) for i in range(size + 1)]
+                dbos = s.scalars(select(TClassOther).order_by(TClassOther.id)).all()
                 for i, dbo in enumerate(dbos):
                     self.assertEqual(dbo.id, i + 1)
                     self.assertEqual(dbo.name, str(i))
@@ -135,12 +198,99 @@ class TestDBFuncs(unittest.TestCase):
                     else:
                         self.assertEqual(dbo.other, str(i))
 
+    @unittest.skipUnless(PERF_SIZE, "SE_PERF_SIZE is not set")
+    def test_linsert_update_all_mix_scaled(self):
+        size = PERF_SIZE
+        half = size // 2
+        with create_test_db() as db:
+            with db.Session() as s:
+                params = [{"name": str(i), "other": str(i)} for i in range(size)]
+                s.execute(insert(TClassOther), params)
+                os2 = [
+                    TClassOther(name=str(i), other="new")
+                    for i in range(half, size + half)
+                ]
+                s.linsert_update_all(os2)
+                s.flush()
+                self.assertTrue(all(o.id is not None for o in os2))
+                self.assertEqual(s.count(TClassOther), size + half)
+                ## one select for all the rows instead of a get per row
+                stmt = select(TClassOther.name, TClassOther.other)
+                others = dict(s.execute(stmt).all())
+                expected = {str(i): str(i) for i in range(half)}
+                expected.update((str(i), "new") for i in range(half, size + half))
+                self.assertEqual(others, expected)
+
+    def test_linsert_update_all_unique_listener(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                s.add(TClassOtherUniqueListener(name="0", other="0"))
+                s.flush()
+                os2 = [
+                    TClassOtherUniqueListener(name=str(i), other="new")
+                    for i in range(2)
+                ]
+                s.linsert_update_all(os2, flush=True)
+                stmt = select(
+                    TClassOtherUniqueListener.other, TClassOtherUniqueListener.stamp
+                ).order_by(TClassOtherUniqueListener.id)
+                rows = s.execute(stmt).all()
+                self.assertEqual(rows, [("new", "update"), ("new", "insert")])
+
+    def test_linsert_update_all_unique_tz_datetime(self):
+        ## SQLite reads the datetimes back naive, the rows are matched by order
+        with create_test_db() as db:
+            ats = [datetime(2020, 1, x, tzinfo=timezone.utc) for x in (1, 2)]
+            with db.Session() as s:
+                s.add(TClassUniqueTZ(at=ats[0], other="0"))
+                s.commit()
+                s.expunge_all()
+                os2 = [TClassUniqueTZ(at=at, other="new") for at in reversed(ats)]
+                s.linsert_update_all(os2, flush=True)
+                self.assertEqual([o.id for o in os2], [2, 1])
+                stmt = select(TClassUniqueTZ.other).order_by(TClassUniqueTZ.id)
+                self.assertEqual(s.scalars(stmt).all(), ["new", "new"])
+
+    def test_linsert_update_unique(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                o = TClassOtherUnique(name="1", other="1")
+                s.add(o)
+                s.flush()
+                o2 = TClassOtherUnique(name="1", other="2")
+                s.linsert_update(o2)
+                o3 = TClassOtherUnique(name="3", other="3")
+                s.linsert_update(o3, commit=True)
+                self.assertEqual(o2.id, o.id)
+                self.assertEqual(o.other, "2")
+                self.assertIsNotNone(o3.id)
+                self.assertEqual(s.get(TClassOtherUnique, o3.id).other, "3")
+                self.assertEqual(s.count(TClassOtherUnique), 2)
+
+    def test_linsert_update_all_unique_mix(self):
+        size = 2
+        with create_test_db() as db:
+            with db.Session() as s:
+                os = [TClassOtherUnique(name=str(i), other=str(i)) for i in range(size)]
+                s.add_all(os)
+                s.flush()
+                os2 = [
+                    TClassOtherUnique(name=str(i), other=str(i + size))
+                    for i in range(1, size + 1)
+                ]
+                s.linsert_update_all(os2, commit=True)
+                self.assertEqual(s.count(TClassOtherUnique), size + 1)
+                self.assertEqual([o.id for o in os2], [2, 3])
+                stmt = select(TClassOtherUnique).order_by(TClassOtherUnique.id)
+                dbos = s.scalars(stmt).all()
+                self.assertEqual([o.other for o in dbos], ["0", "3", "4"])
+
     def test_attach_keys(self):
         with create_test_db() as db:
             with db.Session() as s:
                 o = TClass(name="1")
                 s.add(o)
-                s.commit()
+                s.flush()
 
                 o = TClass(name="1")
                 s.attach_keys(o)
@@ -150,26 +300,21 @@ class TestDBFuncs(unittest.TestCase):
         size = 2
         with create_test_db() as db:
             with db.Session() as s:
-                os = [TClass(name=str(i)) for i in range(size)]
-                s.add_all(os)
-                s.commit()
+                stmt = insert(TClass).returning(TClass.id, sort_by_parameter_order=True)
+                ids = s.scalars(stmt, [{"name": str(i)} for i in range(size)]).all()
 
                 os2 = [TClass(name=str(i)) for i in range(size)]
                 s.attach_keys_all(os2)
-                for o1, o2 in zip(os, os2):
-                    self.assertEqual(o1.id, o2.id)
+                self.assertEqual([o.id for o in os2], ids)
 
     def test_find_keys_all_single(self):
         size = 2
         with create_test_db() as db:
             with db.Session() as s:
-                os = [TClass(name=str(i)) for i in range(size)]
-                lids = [o._log_vals for o in os]
-                s.add_all(os)
-                s.commit()
-                ids = s.find_keys_all(TClass, lids)
-                self.assertEqual(ids[0][0], 1)
-                self.assertEqual(ids[1][0], 2)
+                names = [str(i) for i in range(size)]
+                s.execute(insert(TClass), [{"name": n} for n in names])
+                ids = s.find_keys_all(TClass, [(n,) for n in names])
+                self.assertEqual(ids, [(1,), (2,)])
 
     def test_find_keys_single(self):
         name = "1"
@@ -177,19 +322,52 @@ class TestDBFuncs(unittest.TestCase):
             with db.Session() as s:
                 o = TClass(name=name)
                 s.add(o)
-                s.commit()
+                s.flush()
                 robj = s.find_keys(TClass, name)
                 self.assertEqual(robj, o.id)
                 robj = s.lget(TClass, "NotFound")
                 self.assertIsNone(robj)
 
+    def test_lookups_compiled_cache(self):
+        size = 3
+        with create_test_db() as db:
+            with db.Session() as s:
+                s.add_all([TClassOther(name=str(i), other=str(i)) for i in range(size)])
+                s.flush()
+
+                def lookups(i):
+                    s.find_keys(TClassOther, str(i))
+                    s.find_keys_all(TClassOther, [(str(i),)])
+                    s.lget(TClassOther, str(i))
+                    s.linsert_update_all([TClassOther(name=str(i), other="new")])
+                    s.flush()
+
+                ## the first lookups compile the statements, after that the
+                ## same statement shapes with other values are cache hits
+                lookups(0)
+                cache_stats = []
+
+                def record(conn, cursor, statement, params, context, executemany):
+                    cache_stats.append((context.cache_hit, statement))
+
+                engine = s.get_bind()
+                event.listen(engine, "after_cursor_execute", record)
+                try:
+                    for i in range(1, size):
+                        lookups(i)
+                finally:
+                    event.remove(engine, "after_cursor_execute", record)
+                self.assertTrue(cache_stats)
+                for cache_hit, statement in cache_stats:
+                    self.assertEqual(cache_hit, CACHE_HIT, statement)
+
     def test_find_keys_multiple(self):
         name = "1"
         with create_test_db() as db:
             with db.Session() as s:
                 o = TClass2(name=name, id=int(name), id2=int(name))
                 s.add(o)
-                s.commit()
+                s.flush()
                 ## We should have an id
                 self.assertEqual(o.id, 1)
 
@@ -204,7 +382,7 @@ class TestDBFuncs(unittest.TestCase):
             with db.Session() as s:
                 o = DClass(name=name, name2=name)
                 s.add(o)
-                s.commit()
+                s.flush()
                 ## We should have an id
                 self.assertEqual(o.id, 1)
 
@@ -212,27 +390,112 @@ class TestDBFuncs(unittest.TestCase):
                 oid = s.find_keys(DClass, [name, name])
                 self.assertEqual(oid, 1)
 
+    def test_lexists_all(self):
+        size = 2
+        with create_test_db() as db:
+            with db.Session() as s:
+                stmt = insert(TClass).returning(TClass.id, sort_by_parameter_order=True)
+                dbids = s.scalars(stmt, [{"name": str(i)} for i in range(size)]).all()
+
+                os2 = [TClass(name=str(i)) for i in range(size + 1)]
+                ids = s.lexists_all(os2)
+                self.assertEqual(len(ids), size + 1)
+                for dbid, oid in zip(dbids, ids):
+                    self.assertEqual(oid[0], dbid)
+                self.assertIsNone(ids[-1])
+
     def test_lget_single(self):
         name = "1"
         with create_test_db() as db:
             with db.Session() as s:
                 o = TClass(name=name)
                 s.add(o)
-                s.commit()
+                s.flush()
                 robj = s.lget(TClass, name)
                 self.assertEqual(robj.id, o.id)
                 robj = s.lget(TClass, "NotFound")
                 self.assertIsNone(robj)
 
-    def test_count(self):
+    def test_from_dicts_add(self):
         size = 2
         with create_test_db() as db:
             with db.Session() as s:
-                os = [TClass(name=str(x)) for x in range(size)]
+                dicts = [{"name": str(i), "other": str(i)} for i in range(size)]
+                os = TClassOther.from_dicts(dicts)
                 s.add_all(os)
-                s.commit()
+                s.flush()
+                self.assertEqual([o.id for o in os], [1, 2])
+                stmt = select(TClassOther.name, TClassOther.other)
+                rows = s.execute(stmt.order_by(TClassOther.id)).all()
+                self.assertEqual(rows, [tuple(d.values()) for d in dicts])
+
+    def test_from_dicts_insert_ignore_all(self):
+        size = 2
+        with create_test_db() as db:
+            with db.Session() as s:
+                dicts = [{"name": str(i), "other": str(i)} for i in range(size)]
+                os = TClassOther.from_dicts(dicts)
+                s.insert_ignore_all(os, flush=True)
+                self.assertEqual([o.id for o in os], [1, 2])
+                stmt = select(TClassOther.name, TClassOther.other)
+                rows = s.execute(stmt.order_by(TClassOther.id)).all()
+                self.assertEqual(rows, [tuple(d.values()) for d in dicts])
+
+    def test_sessionmaker_begin_nested(self):
+        with create_test_db() as db:
+            with db.Session.begin_nested() as s:
+                s.add(TClass(name="0"))
+                ## a SAVEPOINT inside only rolls back its own changes
+                with self.assertRaises(ValueError):
+                    with s.begin_nested():
+                        s.add(TClass(name="1"))
+                        raise ValueError
+            ## an exception rolls back the whole transaction
+            with self.assertRaises(ValueError):
+                with db.Session.begin_nested() as s:
+                    s.add(TClass(name="2"))
+                    s.flush()
+                    raise ValueError
+            with db.Session() as s:
+                self.assertEqual(s.scalars(select(TClass.name)).all(), ["0"])
+
+    def test_count(self):
+        size = 2
+        with create_test_db() as db:
+            with db.Session() as s:
+                s.execute(insert(TClass), [{"name": str(x)} for x in range(size)])
                 self.assertEqual(s.count(TClass), size)
 
 
+class TestCopy(unittest.TestCase):
+    def test_copy_text_value(self):
+        self.assertEqual(_copy_text_value(None), "\\N")
+        self.assertEqual(_copy_text_value(True), "t")
+        self.assertEqual(_copy_text_value(False), "f")
+        self.assertEqual(_copy_text_value(1), "1")
+        self.assertEqual(_copy_text_value("a\tb\nc\rd\\e"), "a\\tb\\nc\\rd\\\\e")
+
+    def test_copy_columns_supported(self):
+        ## not in Base's metadata, SQLite can't create ARRAY columns
+        table = Table(
+            "tclasses_with_array",
+            MetaData(),
+            Column("id", Integer, primary_key=True),
+            Column("name", String(32)),
+            Column("values", ARRAY(Integer)),
+            Column("data", LargeBinary),
+        )
+        self.assertTrue(_copy_columns_supported(table, ("id", "name")))
+        self.assertFalse(_copy_columns_supported(table, ("name", "values")))
+        self.assertFalse(_copy_columns_supported(table, ("name", "data")))
+
+    def test_copy_insert_none_logical_value(self):
+        with create_test_db() as db:
+            with db.Session() as s:
+                objs = [DClass(name="1", name2=None), DClass(name="2", name2="2")]
+                self.assertFalse(s._copy_insert(objs))
+                self.assertEqual(s.count(DClass), 0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -3,7 +3,7 @@ import unittest
 from typing import List
 
 from sqlalchemy import ForeignKey, String, select
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, load_only, mapped_column, relationship
 from sqlgold import DB
 from sqlgold.utils.test_db_utils import create_test_db, set_test_config
 
@@ -45,22 +45,18 @@ class TestPC_DBFuncs(unittest.TestCase):
 
             with db.Session() as s:
                 s.linsert_ignore_all(sources.values(), commit=True)
-                stmt = select(TParent)
+                stmt = select(TParent).options(load_only(TParent.id))
                 self.assertEqual(len(list(s.scalars(stmt))), size)
-            all_children = []
-            for s in sources.values():
-                children = {
-                    str(x): TChild(name=str(x), parent_id=s.id)
-                    for x in range(nchildren)
-                }
-                all_children.extend(children.values())
+            all_children = [
+                TChild(name=str(x), parent_id=s.id)
+                for s in sources.values()
+                for x in range(nchildren)
+            ]
 
             with db.Session() as s:
                 s.linsert_ignore_all(all_children, commit=True)
-                stmt = select(TParent)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
-                stmt = select(TChild)
-                self.assertEqual(len(list(s.scalars(stmt))), size * nchildren)
+                self.assertEqual(s.count(TParent), size)
+                self.assertEqual(s.count(TChild), size * nchildren)
 
     def test_object_linsert_ignore_parent_child_ids(self):
         with create_test_db() as db:
@@ -69,40 +65,39 @@ class TestPC_DBFuncs(unittest.TestCase):
             sources = {str(x): TParent(id=10 + x, name=str(x)) for x in range(size)}
             with db.Session() as s:
                 s.linsert_ignore_all(sources.values(), commit=True)
-                stmt = select(TParent)
-                sources2 = list(s.scalars(stmt))
-                self.assertEqual(len(sources), len(sources2))
-                for x, y in zip(sources.values(), sources2):
-                    self.assertEqual(x.id, y.id)
-                    self.assertEqual(x.name, y.name)
-            children = {
-                str(x): TChild(id=10 + x, parent_id=10 + x, name=str(x))
-                for x in range(size)
-            }
+                ## compare against the values the parents were made with, reading
+                ## them from the expired parents would refresh each one
+                stmt = select(TParent.id, TParent.name).order_by(TParent.id)
+                rows = s.execute(stmt).all()
+                self.assertEqual(rows, [(10 + x, str(x)) for x in range(size)])
+            children = [
+                TChild(id=10 + x, parent_id=10 + x, name=str(x)) for x in range(size)
+            ]
             with db.Session() as s:
-                s.linsert_ignore_all(children.values())
-                stmt = select(TChild)
-                children2 = list(s.scalars(stmt))
-                self.assertEqual(len(children), len(children2))
-                for x, y in zip(children.values(), children2):
-                    self.assertEqual(x.id, y.id)
-                    self.assertEqual(x.parent_id, y.parent_id)
-                    self.assertEqual(x.name, y.name)
+                s.linsert_ignore_all(children)
+                stmt = select(TChild.id, TChild.parent_id, TChild.name).order_by(
+                    TChild.id
+                )
+                rows = s.execute(stmt).all()
+                self.assertEqual(len(children), len(rows))
+                for x, row in zip(children, rows):
+                    self.assertEqual(x.id, row.id)
+                    self.assertEqual(x.parent_id, row.parent_id)
+                    self.assertEqual(x.name, row.name)
 
     def test_basic_linsert_parent_child_noparent_backpop_inserts(self):
         with create_test_db() as db:
             size = 3
-            sources = {str(x): TParent(name=str(x)) for x in range(size)}
-            all_children = {}
-            for k, s in sources.items():
-                children = {str(x): TChild(name=str(x)) for x in range(size)}
-                all_children[k] = children.values()
-                s.children = list(children.values())
+            inserted_objs = [
+                TParent(
+                    name=str(x), children=[TChild(name=str(y)) for y in range(size)]
+                )
+                for x in range(size)
+            ]
             with db.Session() as s:
-                inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TParent)))
+                dbobjs = list(s.scalars(select(TParent).options(load_only(TParent.id))))
                 self.assertEqual(len(dbobjs), size)
                 # check id in session
                 for o in inserted_objs:
@@ -125,25 +120,24 @@ class TestPC_DBFuncs(unittest.TestCase):
             sources = {str(x): TParent(name=str(x)) for x in range(size)}
             all_children = {}
             for k, s in sources.items():
-                children = {str(x): TChild(name=str(x)) for x in range(size)}
-                all_children[k] = children.values()
-                s.children = list(children.values())
+                children = [TChild(name=str(x)) for x in range(size)]
+                all_children[k] = children
+                s.children = children
             with db.Session(expire_on_commit=False) as s:
                 inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
             ## Duplicates
             all_dup_children = {}
             for k, s in sources.items():
-                dup_children = {str(x): TChild(name=str(x)) for x in range(size)}
-                all_dup_children[k] = dup_children.values()
-                s.children = list(dup_children.values())
+                dup_children = [TChild(name=str(x)) for x in range(size)]
+                all_dup_children[k] = dup_children
+                s.children = dup_children
 
             with db.Session() as s:
                 inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TParent)))
-                self.assertEqual(len(dbobjs), size)
+                self.assertEqual(s.count(TParent), size)
                 # check id in session
                 for o in inserted_objs:
                     self.assertIsNotNone(o.id)
@@ -3,7 +3,7 @@ import unittest
 from typing import List
 
 from sqlalchemy import ForeignKey, String, select
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, load_only, mapped_column, relationship
 from sqlgold import DB
 from sqlgold.utils.test_db_utils import create_test_db, set_test_config
 
@@ -48,36 +48,51 @@ class TestPCB_DBFuncs(unittest.TestCase):
 
             with db.Session() as s:
                 s.linsert_ignore_all(sources.values(), commit=True)
-                stmt = select(TParent)
+                stmt = select(TParent).options(load_only(TParent.id))
                 self.assertEqual(len(list(s.scalars(stmt))), size)
-            all_children = []
-            for s in sources.values():
-                children = {
-                    str(x): TChild(name=str(x), parent=s) for x in range(nchildren)
-                }
-                all_children.extend(children.values())
+            all_children = [
+                TChild(name=str(x), parent=s)
+                for s in sources.values()
+                for x in range(nchildren)
+            ]
 
             with db.Session() as s:
                 s.linsert_ignore_all(all_children, commit=True)
-                stmt = select(TParent)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
-                stmt = select(TChild)
-                self.assertEqual(len(list(s.scalars(stmt))), size * nchildren)
+                self.assertEqual(s.count(TParent), size)
+                self.assertEqual(s.count(TChild), size * nchildren)
+
+    def test_backpop_append_to_expired_parent(self):
+        with create_test_db() as db:
+            size = 3
+            parents = [TParent(name=str(x)) for x in range(size)]
+            with db.Session() as s:
+                s.linsert_ignore_all(parents, commit=True)
+                ## the backref appends to the expired parents' unloaded children,
+                ## a flush would drop the appends as the children aren't in the
+                ## session yet
+                children = [TChild(name="0", parent=p) for p in parents]
+                with s.no_autoflush:
+                    s.linsert_ignore_all(parents)
+                s.flush()
+
+                self.assertEqual(s.count(TChild), size)
+                for p, c in zip(parents, children):
+                    self.assertIsNotNone(c.id)
+                    self.assertEqual(c.parent_id, p.id)
 
     def test_basic_linsert_parent_child_backpop_inserts(self):
         with create_test_db() as db:
             size = 3
-            sources = {str(x): TParent(name=str(x)) for x in range(size)}
-            all_children = {}
-            for k, s in sources.items():
-                children = {str(x): TChild(name=str(x)) for x in range(size)}
-                all_children[k] = children.values()
-                s.children = list(children.values())
+            inserted_objs = [
+                TParent(
+                    name=str(x), children=[TChild(name=str(y)) for y in range(size)]
+                )
+                for x in range(size)
+            ]
             with db.Session() as s:
-                inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TParent)))
+                dbobjs = list(s.scalars(select(TParent).options(load_only(TParent.id))))
                 self.assertEqual(len(dbobjs), size)
                 # check id in session
                 for o in inserted_objs:
@@ -101,25 +116,24 @@ class TestPCB_DBFuncs(unittest.TestCase):
             sources = {str(x): TParent(name=str(x)) for x in range(size)}
             all_children = {}
             for k, s in sources.items():
-                children = {str(x): TChild(name=str(x)) for x in range(size)}
-                all_children[k] = children.values()
-                s.children = list(children.values())
+                children = [TChild(name=str(x)) for x in range(size)]
+                all_children[k] = children
+                s.children = children
             with db.Session(expire_on_commit=False) as s:
                 inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
             ## Duplicates
             all_dup_children = {}
             for k, s in sources.items():
-                dup_children = {str(x): TChild(name=str(x)) for x in range(size)}
-                all_dup_children[k] = dup_children.values()
-                s.children = list(dup_children.values())
+                dup_children = [TChild(name=str(x)) for x in range(size)]
+                all_dup_children[k] = dup_children
+                s.children = dup_children
 
             with db.Session(expire_on_commit=False) as s:
                 inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TParent)))
-                self.assertEqual(len(dbobjs), size)
+                self.assertEqual(s.count(TParent), size)
                 # check id in session
                 for o in inserted_objs:
                     self.assertIsNotNone(o.id)
@@ -3,7 +3,7 @@ import unittest
 from typing import List
 
 from sqlalchemy import ForeignKey, String, select
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, load_only, mapped_column, relationship
 from sqlgold import DB
 from sqlgold.utils.test_db_utils import create_test_db, set_test_config
 
@@ -62,29 +62,25 @@ class TestPCB_DBFuncs(unittest.TestCase):
 
             with db.Session() as s:
                 s.linsert_ignore_all(sources.values(), commit=True)
-                stmt = select(TParent)
+                stmt = select(TParent).options(load_only(TParent.id))
                 self.assertEqual(len(list(s.scalars(stmt))), size)
-            all_children1 = []
-            all_children2 = []
-            for s in sources.values():
-                children1 = {
-                    str(x): TChild1(name=str(x), parent=s) for x in range(nchildren)
-                }
-                all_children1.extend(children1.values())
-                children2 = {
-                    str(x): TChild2(name=str(x), parent=s) for x in range(nchildren)
-                }
-                all_children2.extend(children2.values())
+            all_children1 = [
+                TChild1(name=str(x), parent=s)
+                for s in sources.values()
+                for x in range(nchildren)
+            ]
+            all_children2 = [
+                TChild2(name=str(x), parent=s)
+                for s in sources.values()
+                for x in range(nchildren)
+            ]
 
             with db.Session() as s:
                 s.linsert_ignore_all(all_children1, commit=True)
                 s.linsert_ignore_all(all_children2, commit=True)
-                stmt = select(TParent)
-                self.assertEqual(len(list(s.scalars(stmt))), size)
-                stmt = select(TChild1)
-                self.assertEqual(len(list(s.scalars(stmt))), size * nchildren)
-                stmt = select(TChild2)
-                self.assertEqual(len(list(s.scalars(stmt))), size * nchildren)
+                self.assertEqual(s.count(TParent), size)
+                self.assertEqual(s.count(TChild1), size * nchildren)
+                self.assertEqual(s.count(TChild2), size * nchildren)
 
     def test_basic_linsert_parent_child_backpop_inserts(self):
         with create_test_db() as db:
@@ -92,16 +88,14 @@ class TestPCB_DBFuncs(unittest.TestCase):
             nchildren = 3
             sources = {str(x): TParent(name=str(x)) for x in range(size)}
             for k, s in sources.items():
-                children1 = {str(x): TChild1(name=str(x)) for x in range(nchildren)}
-                s.children1 = list(children1.values())
-                children2 = {str(x): TChild2(name=str(x)) for x in range(nchildren)}
-                s.children2 = list(children2.values())
+                s.children1 = [TChild1(name=str(x)) for x in range(nchildren)]
+                s.children2 = [TChild2(name=str(x)) for x in range(nchildren)]
 
             with db.Session() as s:
                 inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TParent)))
+                dbobjs = list(s.scalars(select(TParent).options(load_only(TParent.id))))
                 self.assertEqual(len(dbobjs), size)
                 # check id in session
                 for o in inserted_objs:
@@ -134,12 +128,11 @@ class TestPCB_DBFuncs(unittest.TestCase):
             sources = {str(x): TParent(name=str(x)) for x in range(size)}
             all_children = {}
             for k, s in sources.items():
-                children1 = {str(x): TChild1(name=str(x)) for x in range(nchildren)}
-                all_children[k] = list(children1.values())
-                s.children1 = list(children1.values())
-                children2 = {str(x): TChild2(name=str(x)) for x in range(nchildren)}
-                all_children[k].extend(children2.values())
-                s.children2 = list(children2.values())
+                children1 = [TChild1(name=str(x)) for x in range(nchildren)]
+                children2 = [TChild2(name=str(x)) for x in range(nchildren)]
+                all_children[k] = children1 + children2
+                s.children1 = children1
+                s.children2 = children2
 
             with db.Session(expire_on_commit=False) as s:
                 inserted_objs = list(sources.values())
@@ -148,19 +141,17 @@ class TestPCB_DBFuncs(unittest.TestCase):
             ## Duplicates
             all_dup_children = {}
             for k, s in sources.items():
-                children1 = {str(x): TChild1(name=str(x)) for x in range(nchildren)}
-                all_dup_children[k] = list(children1.values())
-                s.children1 = list(children1.values())
-                children2 = {str(x): TChild2(name=str(x)) for x in range(nchildren)}
-                all_dup_children[k].extend(children2.values())
-                s.children2 = list(children2.values())
+                children1 = [TChild1(name=str(x)) for x in range(nchildren)]
+                children2 = [TChild2(name=str(x)) for x in range(nchildren)]
+                all_dup_children[k] = children1 + children2
+                s.children1 = children1
+                s.children2 = children2
 
             with db.Session() as s:
                 inserted_objs = list(sources.values())
                 s.linsert_ignore_all(inserted_objs, commit=True)
 
-                dbobjs = list(s.scalars(select(TParent)))
-                self.assertEqual(len(dbobjs), size)
+                self.assertEqual(s.count(TParent), size)
                 # check id in session
                 for o in inserted_objs:
                     self.assertIsNotNone(o.id)
@@ -169,15 +160,13 @@ class TestPCB_DBFuncs(unittest.TestCase):
                         self.assertEqual(c.parent_id, o.id)
                         self.assertEqual(c.parent, o)
 
-            # check id out of session
-            for o in inserted_objs:
+            # check id out of session and that the duplicates got the first ids
+            for k, o in sources.items():
                 self.assertIsNotNone(o.id)
                 for c in o.children1:
                     self.assertIsNotNone(c.id)
                     self.assertEqual(c.parent_id, o.id)
                     self.assertEqual(c.parent, o)
-
-            for k, s in sources.items():
                 for old, new in zip(all_children[k], all_dup_children[k]):
                     self.assertEqual(old.id, new.id)
                     self.assertEqual(old.name, new.name)